@@ -1,66 +1,178 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
 from datetime import datetime
+import copy
 import json
+import os
+import threading
+import time
+from booking_file import BookingFileTail
+from config import LEDGER_FILE, TRACE_FILE, USERS_FILE
+from events import EventBus, sse_stream
+from ledger import BookingLedger
+from metrics import Histogram, ROUTE_BUCKETS, STEP_BUCKETS, TraceFileTail, render_metrics
+from user_store import UserStore
 
 app = Flask(__name__)
 
-CONFIG_FILE = '/Users/admin/pip_install/config.py'
 BOOKING_FILE = '/Users/admin/pip_install/booking_reference.txt'
 
-# Load user details from config file
+# /get_all_bookings page sizes
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# /events: how often the booking file is checked for new bookings, and the
+# longest gap between messages to a client (seconds)
+BOOKING_POLL_INTERVAL = 1
+HEARTBEAT_INTERVAL = 15
+
+event_bus = EventBus()
+
+# Importing config has already seeded the store from USER_DETAILS_LIST on first run
+user_store = UserStore(USERS_FILE)
+
+ledger = BookingLedger(LEDGER_FILE)
+# How far into the booking file the ledger has imported, kept across restarts
+BOOKING_FILE_KEY = f"booking_file:{os.path.abspath(BOOKING_FILE)}"
+_booking_file_state = ledger.get_meta(BOOKING_FILE_KEY)
+# Incremental reader: each request only parses bytes appended since the last
+# one, and a restart carries on where the ledger's import left off
+booking_tail = BookingFileTail(BOOKING_FILE, json.loads(_booking_file_state) if _booking_file_state else None)
+_sync_lock = threading.Lock()
+
+# Parsed user store, re-read only when the file's mtime or size changes
+class UserDetailsCache:
+    def __init__(self, store):
+        self.store = store
+        self.path = store.path
+        self.hits = 0
+        self.misses = 0
+        self._key = None
+        self._users = []
+        self._lock = threading.Lock()
+
+    def _parse(self):
+        return self.store.load()
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._key:
+            self.hits += 1
+            return
+        self.misses += 1
+        self._users = self._parse()
+        self._key = key
+
+    def users(self):
+        # Callers get their own copy so edits never leak into the cache
+        with self._lock:
+            self._refresh()
+            return copy.deepcopy(self._users)
+
+    def invalidate(self):
+        with self._lock:
+            self._key = None
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+user_cache = UserDetailsCache(user_store)
+
+# Load user details from the user store
 def load_user_details():
-    with open(CONFIG_FILE, 'r') as file:
-        content = file.read()
-    exec_globals = {}
-    exec(content, exec_globals)
-    return exec_globals.get('USER_DETAILS_LIST', [])
+    return user_cache.users()
 
-# Save user details to config file
+# Replace every user in the user store
 def save_user_details(user_details_list):
-    with open(CONFIG_FILE, 'r') as file:
-        content = file.readlines()
+    with user_store.transaction() as users:
+        users.clear()
+        users.update({user['email']: user for user in user_details_list})
+    # mtime may not change within the filesystem's timestamp resolution
+    user_cache.invalidate()
+
+# Merge bookings newly appended to the text file into the ledger (the
+# whole history the first time the ledger sees the file), remember the
+# offset, and push them to /events subscribers
+def sync_bookings():
+    with _sync_lock:
+        new_records = booking_tail.refresh()
+        if not new_records:
+            return
+        ledger.record_many(new_records)
+        ledger.set_meta(BOOKING_FILE_KEY, json.dumps(booking_tail.state()))
+    for record in new_records:
+        event_bus.publish('booking', record)
+
+# Bookings are written by main.py in another process; the booking file is
+# how they reach this one. Poll it while anyone is listening on /events.
+_booking_watcher = None
+_booking_watcher_lock = threading.Lock()
+
+def _watch_bookings():
+    global _booking_watcher
+    while True:
+        # Decide to stop under the lock, so a client subscribing meanwhile
+        # either keeps this thread going or finds it gone and starts another
+        with _booking_watcher_lock:
+            if not event_bus.subscriber_count():
+                _booking_watcher = None
+                return
+        try:
+            sync_bookings()
+        except Exception as e:
+            app.logger.error(f"Booking sync failed: {e}")
+        time.sleep(BOOKING_POLL_INTERVAL)
 
-    start_index = next(
-        i for i, line in enumerate(content)
-        if line.strip().startswith("USER_DETAILS_LIST =")
-    )
-    end_index = start_index + 1
-    while not content[end_index].strip() == ']':
-        end_index += 1
-    end_index += 1
+def ensure_booking_watcher():
+    global _booking_watcher
+    with _booking_watcher_lock:
+        if _booking_watcher is None:
+            _booking_watcher = threading.Thread(target=_watch_bookings, name='booking-watcher', daemon=True)
+            _booking_watcher.start()
 
-    new_list = f"USER_DETAILS_LIST = {json.dumps(user_details_list, indent=4)}\n"
-    content[start_index:end_index] = [new_list]
+# Load existing history now so only later bookings are pushed as events
+sync_bookings()
 
-    with open(CONFIG_FILE, 'w') as file:
-        file.writelines(content)
+# Prometheus histograms for /metrics: booking step timings from main.py's
+# trace file, and latency of this app's own routes
+booking_step_seconds = Histogram(
+    'booking_step_duration_seconds', 'Time spent in each booking step.', ('step',), STEP_BUCKETS
+)
+booking_seconds = Histogram(
+    'booking_duration_seconds', 'End-to-end booking time per vehicle.', ('result',), STEP_BUCKETS
+)
+request_seconds = Histogram(
+    'http_request_duration_seconds', 'Dashboard request latency.', ('method', 'route', 'status'), ROUTE_BUCKETS
+)
+trace_tail = TraceFileTail(TRACE_FILE)
+
+# Fold traces written since the last scrape into the booking histograms
+def sync_traces():
+    for trace in trace_tail.refresh():
+        booking_seconds.observe(trace.get('total_ms', 0) / 1000,
+                                result='success' if trace.get('success') else 'failure')
+        for span in trace.get('spans', []):
+            booking_step_seconds.observe(span.get('duration_ms', 0) / 1000, step=span.get('step'))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+# Streaming routes (/events, ndjson) are timed until the response starts
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.observe(time.perf_counter() - started,
+                                method=request.method, route=route, status=response.status_code)
+    return response
 
 # Return today's bookings (by comparing date)
 def get_bookings_today():
     today = datetime.now().strftime('%Y-%m-%d')
-    bookings = []
-    with open(BOOKING_FILE, 'r') as file:
-        lines = file.readlines()
-
-    current_booking = {}
-    for line in lines:
-        line = line.strip()
-        if line.startswith("Booking Reference:"):
-            # If we have a current booking with today's date, append it
-            if current_booking and current_booking.get("date") == today:
-                bookings.append(current_booking)
-                current_booking = {}
-            current_booking["reference"] = line.split(":")[1].strip()
-        elif line.startswith("Booking Date:"):
-            current_booking["date"] = line.split(":")[1].strip()
-        elif line.startswith("BOOKED FOR"):
-            current_booking["name"] = line.split("BOOKED FOR")[1].strip()
-
-    # Check the final booking in case it's also for today
-    if current_booking and current_booking.get("date") == today:
-        bookings.append(current_booking)
-
-    return bookings
+    sync_bookings()
+    return ledger.on_date(today)
 
 @app.route('/')
 def index():
@@ -87,104 +199,146 @@ def get_bookings_today_endpoint():
 
 @app.route('/view_today_booking_file', methods=['GET'])
 def view_today_booking_file():
-    today = datetime.now().strftime('%Y-%m-%d')
-    filtered_entries = []
-
-    with open(BOOKING_FILE, 'r') as file:
-        lines = file.readlines()
-
-    entry = {}
-    for line in lines:
-        line = line.strip()
-        if line.startswith("BOOKED FOR"):
-            entry["name"] = line.split("BOOKED FOR")[1].strip()
-        elif line.startswith("Booking Reference:"):
-            entry["reference"] = line.split(":")[1].strip()
-        elif line.startswith("Booking Date:"):
-            date = line.split(":")[1].strip()
-            entry["date"] = date
-            if date.startswith(today):
-                filtered_entries.append(entry)
-                entry = {}
-
-    return jsonify({"content": filtered_entries})
+    return jsonify({"content": get_bookings_today()})
 
+# Filters shared by the paged and streaming forms of /get_all_bookings
+def booking_filters(args):
+    return {
+        "start_date": args.get('from') or None,
+        "end_date": args.get('to') or None,
+        "name": args.get('name') or None,
+    }
+
+# Paged by default: ?limit=&cursor=&from=YYYY-MM-DD&to=YYYY-MM-DD&name=
+# ?format=ndjson streams every matching booking, one JSON object per line
 @app.route('/get_all_bookings', methods=['GET'])
 def get_all_bookings():
-    bookings = []
-    with open(BOOKING_FILE, 'r') as file:
-        lines = file.readlines()
-
-    current_booking = {}
-    for line in lines:
-        line = line.strip()
-        if line.startswith("Booking Reference:"):
-            if current_booking:
-                bookings.append(current_booking)
-                current_booking = {}
-            current_booking["reference"] = line.split(":")[1].strip()
-        elif line.startswith("Booking Date:"):
-            current_booking["date"] = line.split(":")[1].strip()
-        elif line.startswith("BOOKED FOR"):
-            current_booking["name"] = line.split("BOOKED FOR")[1].strip()
-
-    if current_booking:
-        bookings.append(current_booking)
-
-    return jsonify(bookings)
+    sync_bookings()
+    filters = booking_filters(request.args)
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for booking in ledger.iter_query(**filters):
+                yield json.dumps(booking) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        bookings, next_cursor = ledger.page(limit, request.args.get('cursor'), **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"bookings": bookings, "next_cursor": next_cursor})
+
+# Server-sent events: 'booking' and 'user' diffs as they happen, plus 'heartbeat'
+@app.route('/events', methods=['GET'])
+def events():
+    stream = sse_stream(event_bus, HEARTBEAT_INTERVAL)
+    # Subscribe before the watcher starts so it sees a listener
+    first = next(stream)
+    ensure_booking_watcher()
+
+    def generate():
+        yield first
+        yield from stream
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    sync_traces()
+    return Response(render_metrics(booking_step_seconds, booking_seconds, request_seconds),
+                    mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({"user_details": user_cache.stats()})
+
+# For partial updates, we will fill in any missing fields from the existing user
+# so we don't accidentally overwrite them with 'N' or empty strings if not provided.
+def merge_user_fields(existing_user, new_data):
+    # Merge all known fields but preserve existing if new_data doesn't have them
+    existing_user['first_name'] = new_data.get('first_name', existing_user.get('first_name', ''))
+    existing_user['last_name'] = new_data.get('last_name', existing_user.get('last_name', ''))
+    existing_user['vehicle_reg'] = new_data.get('vehicle_reg', existing_user.get('vehicle_reg', ''))
+    existing_user['Book'] = new_data.get('Book', existing_user.get('Book', 'N'))
+
+    # Days of the week. If new_data has them, update. Otherwise, keep existing.
+    for d in ['mon', 'tue', 'wed', 'thu', 'fri' , 'sat' , 'sun']:
+        if d in new_data:
+            existing_user[d] = new_data[d]
+        else:
+            # If it doesn't exist, preserve old or default to 'N'
+            existing_user[d] = existing_user.get(d, 'N')
+
+    existing_user['update_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return existing_user
+
+def new_user_fields(data):
+    return {
+        'email': data['email'],
+        'first_name': data.get('first_name', ''),
+        'last_name': data.get('last_name', ''),
+        'vehicle_reg': data.get('vehicle_reg', ''),
+        'Book': data.get('Book', 'N'),
+        'mon': data.get('mon', 'N'),
+        'tue': data.get('tue', 'N'),
+        'wed': data.get('wed', 'N'),
+        'thu': data.get('thu', 'N'),
+        'fri': data.get('fri', 'N'),
+        'sat': data.get('sat', 'N'),
+        'sun': data.get('sun', 'N'),
+        'update_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+# Merge into the existing user with this email, or create a new one
+def apply_user_update(users, data):
+    email = data['email']
+    if email in users:
+        users[email] = merge_user_fields(users[email], data)
+    else:
+        users[email] = new_user_fields(data)
+    return users[email]
 
 @app.route('/update', methods=['POST'])
 def update_user():
     data = request.json
-    user_details = load_user_details()
-
-    # For partial updates, we will fill in any missing fields from the existing user
-    # so we don't accidentally overwrite them with 'N' or empty strings if not provided.
-    def merge_user_fields(existing_user, new_data):
-        # Merge all known fields but preserve existing if new_data doesn't have them
-        existing_user['first_name'] = new_data.get('first_name', existing_user.get('first_name', ''))
-        existing_user['last_name'] = new_data.get('last_name', existing_user.get('last_name', ''))
-        existing_user['vehicle_reg'] = new_data.get('vehicle_reg', existing_user.get('vehicle_reg', ''))
-        existing_user['Book'] = new_data.get('Book', existing_user.get('Book', 'N'))
-
-        # Days of the week. If new_data has them, update. Otherwise, keep existing.
-        for d in ['mon', 'tue', 'wed', 'thu', 'fri' , 'sat' , 'sun']:
-            if d in new_data:
-                existing_user[d] = new_data[d]
-            else:
-                # If it doesn't exist, preserve old or default to 'N'
-                existing_user[d] = existing_user.get(d, 'N')
-
-        existing_user['update_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        return existing_user
-
-    # Attempt to find user by email
-    for i, user in enumerate(user_details):
-        if user['email'] == data.get('email'):
-            # Merge fields
-            user_details[i] = merge_user_fields(user_details[i], data)
-            break
-    else:
-        # Not found -> create new user
-        new_user = {
-            'email': data['email'],
-            'first_name': data.get('first_name', ''),
-            'last_name': data.get('last_name', ''),
-            'vehicle_reg': data.get('vehicle_reg', ''),
-            'Book': data.get('Book', 'N'),
-            'mon': data.get('mon', 'N'),
-            'tue': data.get('tue', 'N'),
-            'wed': data.get('wed', 'N'),
-            'thu': data.get('thu', 'N'),
-            'fri': data.get('fri', 'N'),
-            'sat': data.get('sat', 'N'),
-            'sun': data.get('sun', 'N'),            
-            'update_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        user_details.append(new_user)
-
-    save_user_details(user_details)
+    # Read-merge-write of one record under the store's lock
+    with user_store.transaction() as users:
+        user = apply_user_update(users, data)
+    user_cache.invalidate()
+    event_bus.publish('user', user)
     return jsonify({"message": "User details updated successfully!"})
 
+# Many user patches in one request: applied in a single store transaction
+# (one write), with a result per patch. Body: {"updates": [{email, ...}, ...]}
+@app.route('/update_bulk', methods=['POST'])
+def update_users_bulk():
+    data = request.json or {}
+    patches = data.get('updates') if isinstance(data, dict) else data
+    if not isinstance(patches, list):
+        return jsonify({"error": "Expected {\"updates\": [...]}"}), 400
+
+    results = []
+    changed = []
+    with user_store.transaction() as users:
+        for patch in patches:
+            email = patch.get('email') if isinstance(patch, dict) else None
+            if not email:
+                results.append({"email": email, "status": "error", "error": "Missing email"})
+                continue
+            status = 'updated' if email in users else 'created'
+            changed.append(apply_user_update(users, patch))
+            results.append({"email": email, "status": status})
+    user_cache.invalidate()
+
+    for user in changed:
+        event_bus.publish('user', user)
+    return jsonify({
+        "message": f"{len(changed)} of {len(patches)} user updates applied.",
+        "results": results,
+    })
+
 if __name__ == '__main__':
     app.run(host='10.180.1.21', port=5000, debug=True)
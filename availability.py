@@ -0,0 +1,147 @@
+# availability.py
+"""
+One shared watcher for Standard Parking availability.
+
+Instead of every sold-out booking polling the site from its own browser,
+a single background thread probes the product list and wakes all waiting
+bookings the moment the sold-out marker disappears.
+"""
+import logging
+import random
+import threading
+from contextlib import contextmanager
+from config import URL, PARKING_DETAILS, AVAILABILITY_MIN_INTERVAL, AVAILABILITY_MAX_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Interval multiplier after each probe that still finds parking sold out
+BACKOFF_FACTOR = 1.5
+# Extra multiplier after a probe error
+ERROR_BACKOFF_FACTOR = 2.0
+# Random +/- fraction applied to every interval so probes don't line up
+JITTER = 0.25
+# Consecutive probe errors before the watcher gives up and waiters fall back
+MAX_PROBE_ERRORS = 5
+
+# Booking form the shared watchers probe
+PROBE_URL = URL
+
+def http_probe(url=URL, parking_details=PARKING_DETAILS):
+    """
+    Builds a probe that posts the date form over HTTP and reports whether
+    Standard Parking (413) is bookable.
+    """
+    from http_engine import HttpBookingEngine, HttpSessionPool
+
+    engine = HttpBookingEngine(url, pool=HttpSessionPool(1))
+
+    def _probe():
+        return engine.standard_parking_available(parking_details)
+    return _probe
+
+class AvailabilityWatcher:
+    """
+    Polls probe() on a background thread with adaptive backoff and jitter.
+
+    Any number of bookings can block in wait_until_available(); they are all
+    released together when a probe reports availability. The thread stops
+    once parking is available, and restarts if someone waits again.
+    """
+
+    def __init__(self, probe, min_interval=AVAILABILITY_MIN_INTERVAL, max_interval=AVAILABILITY_MAX_INTERVAL):
+        self.probe = probe
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.failed = False
+        self.probes = 0
+        self._available = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _next_interval(self, interval, factor):
+        interval = min(interval * factor, self.max_interval)
+        return interval, interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def _run(self):
+        interval = self.min_interval
+        errors = 0
+        while not self._stopped.is_set():
+            try:
+                available = self.probe()
+                self.probes += 1
+                errors = 0
+            except Exception as e:
+                errors += 1
+                logger.warning(f"Availability probe failed ({errors}/{MAX_PROBE_ERRORS}): {str(e)}")
+                if errors >= MAX_PROBE_ERRORS:
+                    logger.error("Availability watcher giving up after repeated probe errors.")
+                    self.failed = True
+                    self._available.set()
+                    return
+                interval, delay = self._next_interval(interval, ERROR_BACKOFF_FACTOR)
+                self._stopped.wait(delay)
+                continue
+
+            if available:
+                logger.info(f"Standard Parking became available (after {self.probes} probes); notifying waiters.")
+                self._available.set()
+                return
+
+            interval, delay = self._next_interval(interval, BACKOFF_FACTOR)
+            logger.debug(f"Still sold out; next probe in {delay:.2f}s")
+            self._stopped.wait(delay)
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._available.clear()
+            self._stopped.clear()
+            self.failed = False
+            self._thread = threading.Thread(target=self._run, name="availability-watcher", daemon=True)
+            self._thread.start()
+
+    def wait_until_available(self, timeout=None):
+        """
+        Blocks until a probe sees Standard Parking available.
+        Returns False on timeout or if the watcher gave up (check .failed).
+        """
+        self._ensure_running()
+        return self._available.wait(timeout) and not self.failed
+
+    def stop(self):
+        self._stopped.set()
+
+# (entry date, exit date) -> [watcher, number of bookings using it]
+_shared_watchers = {}
+_shared_lock = threading.Lock()
+
+@contextmanager
+def shared_watcher(parking_details=PARKING_DETAILS):
+    """
+    The process-wide watcher for parking_details' dates, used by
+    booking.retry_parking_selection. The watcher is stopped and dropped when
+    its last user leaves the block, so a long-running daemon does not keep
+    one per date it has ever booked.
+    """
+    key = (parking_details["entry_date"], parking_details["exit_date"])
+    with _shared_lock:
+        if key not in _shared_watchers:
+            _shared_watchers[key] = [AvailabilityWatcher(http_probe(PROBE_URL, parking_details)), 0]
+        entry = _shared_watchers[key]
+        entry[1] += 1
+    try:
+        yield entry[0]
+    finally:
+        with _shared_lock:
+            entry[1] -= 1
+            if entry[1] == 0 and _shared_watchers.get(key) is entry:
+                entry[0].stop()
+                del _shared_watchers[key]
+
+def stop_shared_watchers():
+    with _shared_lock:
+        for watcher, _ in _shared_watchers.values():
+            watcher.stop()
+        _shared_watchers.clear()
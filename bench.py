@@ -0,0 +1,402 @@
+# bench.py
+"""
+End-to-end booking benchmark against the local mock site (mock_site.py).
+
+Runs the booking flow repeatedly for a test vehicle and reports p50/p95
+end-to-end and per-step latency from the spans tracing.py records. Results
+can be saved and compared, so a change to booking.py can be shown to help:
+
+    python bench.py --runs 10 --latency 0.1 --save before.json
+    python bench.py --runs 10 --latency 0.1 --save after.json
+    python bench.py --compare before.json after.json
+
+--vehicles N books N vehicles at once per run, each in its own Chrome
+("--mode process", as main.py --parallel does) or as tabs of one Chrome
+("--mode tabs", main.py --tabs); peak RSS of every browser process the
+benchmark started is reported alongside the latencies:
+
+    python bench.py --vehicles 4 --mode process --save process.json
+    python bench.py --vehicles 4 --mode tabs --save tabs.json
+    python bench.py --compare process.json tabs.json
+
+--persistent-profile runs every Chrome on a managed profile (profiles.py)
+kept in the scratch directory, so the first run's page loads are cold and
+later runs reuse the disk cache; page_load is reported separately for the two.
+
+Bookings, traces and learned selectors go to a scratch directory (removed
+afterwards unless given with --workdir), never to the real booking file,
+ledger or selector cache.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import availability
+import booking
+import profiles
+import selector_cache
+import tracing
+from config import BOOKING_DETAILS, DRIVER_PROFILE
+from driver_utils import DRIVER_PROFILES, init_driver, reset_driver, wait_for_page_load
+from http_engine import HttpBookingEngine, HttpSessionPool, HttpBookingError, SoldOutError, http_process_booking
+from ledger import BookingLedger
+from metrics import TraceFileTail
+from mock_site import MockAeroparker, start_in_background
+from multitab import MultiTabBrowser
+
+logger = logging.getLogger(__name__)
+
+# Books every day so should_book_today() never skips a run
+BENCH_USER = {
+    "first_name": "Bench",
+    "last_name": "Mark",
+    "email": "bench@example.com",
+    "vehicle_reg": "BENCH1",
+    "Book": "Y",
+    "mon": "Y", "tue": "Y", "wed": "Y", "thu": "Y", "fri": "Y", "sat": "Y", "sun": "Y",
+}
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of values (None if empty).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def descendant_rss_kb(pid):
+    """
+    Total resident memory (KB) of every process descended from pid, from ps
+    (works on macOS and Linux). 0 if ps is unavailable.
+    """
+    try:
+        ps = subprocess.Popen(["ps", "-A", "-o", "pid=,ppid=,rss="], stdout=subprocess.PIPE, text=True)
+        output = ps.communicate()[0]
+    except OSError:
+        return 0
+    children, rss = {}, {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+        child, parent, kb = (int(f) for f in fields)
+        if child == ps.pid:
+            continue
+        children.setdefault(parent, []).append(child)
+        rss[child] = kb
+    total, stack = 0, list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        total += rss.get(child, 0)
+        stack.extend(children.get(child, []))
+    return total
+
+class PeakRssSampler:
+    """
+    Samples descendant_rss_kb() of this process in the background while the
+    block runs: chromedriver and every Chrome process it started.
+    """
+
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            self.peak_kb = max(self.peak_kb, descendant_rss_kb(os.getpid()))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def isolate_outputs(directory):
+    """
+    Points every file the booking flow writes at directory.
+    """
+    booking.BOOKING_REFERENCE_FILE = os.path.join(directory, "booking_reference.txt")
+    with booking._ledger_lock:
+        booking._ledger = BookingLedger(os.path.join(directory, "bookings.db"))
+    with selector_cache._cache_lock:
+        selector_cache._cache = selector_cache.SelectorCache(os.path.join(directory, "selector_cache.json"))
+    with profiles._manager_lock:
+        profiles._manager = profiles.ProfileManager(os.path.join(directory, "profiles"))
+    tracing.TRACE_FILE = os.path.join(directory, "booking_spans.log")
+    return tracing.TRACE_FILE
+
+def run_selenium(url, profile, user, browser=None, persistent_profile=False):
+    """
+    One Selenium booking; returns (success, setup timings in ms).
+    With browser (a MultiTabBrowser) it runs in a new tab instead of its own Chrome.
+    With persistent_profile, setup["profile"] says whether its profile was "new" or "warm".
+    """
+    setup = {}
+    if browser:
+        started = time.perf_counter()
+        driver = browser.open_tab(url)
+        setup["page_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    else:
+        started = time.perf_counter()
+        driver = init_driver(profile, persistent_profile=persistent_profile)
+        setup["launch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if driver.managed_profile:
+            setup["profile"] = "warm" if driver.managed_profile.warm else "new"
+    try:
+        if not browser:
+            started = time.perf_counter()
+            if driver.managed_profile:
+                # As main.py does: only the consent cookies carry over from the last run
+                reset_driver(driver, url)
+            else:
+                driver.get(url)
+            loaded = wait_for_page_load(driver)
+            setup["page_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            if not loaded:
+                return False, setup
+        return booking.process_booking(driver, BOOKING_DETAILS, user), setup
+    finally:
+        driver.quit()
+
+def run_http(url, user):
+    """
+    One booking over the HTTP engine; returns (success, setup timings in ms).
+    If Standard Parking is sold out it waits on the shared availability
+    watcher and tries again, as the Selenium flow does.
+    """
+    engine = HttpBookingEngine(url, pool=HttpSessionPool(1))
+    try:
+        while True:
+            try:
+                return http_process_booking(engine, user), {}
+            except SoldOutError:
+                logger.info("Standard Parking sold out; waiting for the availability watcher...")
+                with availability.shared_watcher() as watcher:
+                    if not watcher.wait_until_available(timeout=booking.SOLD_OUT_WAIT):
+                        return False, {}
+    except HttpBookingError as e:
+        logger.error(f"HTTP booking failed: {e}")
+        return False, {}
+    finally:
+        engine.pool.close()
+
+def run_vehicles(url, engine, profile, users, mode, persistent_profile=False):
+    """
+    Books users at the same time; returns [(success, setup timings)] in order.
+    mode "tabs" shares one Chrome (launched here) between them.
+    """
+    def _book(user, browser=None):
+        try:
+            if engine == "http":
+                return run_http(url, user)
+            return run_selenium(url, profile, user, browser, persistent_profile)
+        except Exception as e:
+            logger.error(f"Booking for {user['vehicle_reg']} failed: {e}")
+            return False, {}
+
+    if engine == "http" or mode != "tabs":
+        with ThreadPoolExecutor(max_workers=len(users), thread_name_prefix="bench") as executor:
+            return list(executor.map(_book, users))
+
+    started = time.perf_counter()
+    browser = MultiTabBrowser(profile, persistent_profile)
+    launch_ms = round((time.perf_counter() - started) * 1000, 1)
+    try:
+        with ThreadPoolExecutor(max_workers=len(users), thread_name_prefix="bench") as executor:
+            outcomes = list(executor.map(lambda user: _book(user, browser), users))
+    finally:
+        browser.quit()
+    # The one launch is shared by every tab
+    return [(success, dict(setup, launch_ms=launch_ms)) for success, setup in outcomes]
+
+def run_benchmark(runs, engine="selenium", profile=DRIVER_PROFILE, latency=0, jitter=0, sold_out_for=0,
+                  workdir=None, vehicles=1, mode="process", persistent_profile=False):
+    """
+    Books BENCH_USER runs times against a fresh mock site and returns the
+    trace record of each booking, with setup timings and the outcome added.
+    vehicles books that many vehicles at once per run, in mode "process"
+    (a Chrome each) or "tabs" (one Chrome); each record carries its run's peak RSS.
+    persistent_profile keeps each Chrome's profile between runs (see profiles.py).
+    Without workdir a scratch directory is used and removed afterwards.
+    """
+    scratch = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="booking-bench-")
+    trace_tail = TraceFileTail(isolate_outputs(workdir))
+
+    site = MockAeroparker(latency=latency, jitter=jitter, sold_out_for=sold_out_for)
+    server = start_in_background(site)
+    # Sold-out waits must probe the mock, not the real site
+    availability.stop_shared_watchers()
+    availability.PROBE_URL = server.booking_url
+    logger.info(f"Benchmarking {runs} {engine} runs of {vehicles} vehicles ({mode}) against {server.booking_url} "
+                f"(scratch dir {workdir})")
+
+    records = []
+    try:
+        for i in range(runs):
+            site.reset()
+            # New vehicles every run: the ledger's idempotency keys would skip a repeat booking
+            users = [
+                dict(BENCH_USER, vehicle_reg=f"{BENCH_USER['vehicle_reg']}-{i + 1}" + (f"-{v + 1}" if vehicles > 1 else ""))
+                for v in range(vehicles)
+            ]
+            started = time.perf_counter()
+            with PeakRssSampler() as rss:
+                outcomes = run_vehicles(server.booking_url, engine, profile, users, mode, persistent_profile)
+            wall_ms = round((time.perf_counter() - started) * 1000, 1)
+
+            traces = {t["vehicle_reg"]: t for t in trace_tail.refresh()}
+            for user, (success, setup) in zip(users, outcomes):
+                record = traces.get(user["vehicle_reg"], {"spans": [], "total_ms": None})
+                record.update(setup, run=i + 1, success=bool(success), wall_ms=wall_ms,
+                              peak_rss_kb=rss.peak_kb)
+                records.append(record)
+            booked = sum(1 for success, _ in outcomes if success)
+            logger.info(f"Run {i + 1}/{runs}: {booked}/{vehicles} booked in {wall_ms:.0f}ms, "
+                        f"peak RSS {rss.peak_kb / 1024:.0f}MB")
+    finally:
+        server.shutdown()
+        availability.stop_shared_watchers()
+        if scratch:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return records
+
+def summarise(records):
+    """
+    {"end_to_end": stats, "steps": {step: stats}} with n, p50, p95 and mean in ms.
+    End-to-end covers successful runs only; steps cover every run.
+    With several vehicles per run, end_to_end is the wall time of the whole run.
+    peak_rss_mb is the highest resident memory of the browsers in any run.
+    """
+    def stats(values):
+        if not values:
+            return {"n": 0, "p50": None, "p95": None, "mean": None}
+        return {
+            "n": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "mean": round(sum(values) / len(values), 1),
+        }
+
+    steps = {}
+    for record in records:
+        for span in record.get("spans", []):
+            steps.setdefault(span["step"], []).append(span["duration_ms"])
+        for key in ("launch_ms", "page_load_ms"):
+            if key in record:
+                # Cold and warm profiles are kept apart so the cache's effect shows
+                step = f"{key[:-3]}_{record['profile']}" if record.get("profile") else key[:-3]
+                steps.setdefault(step, []).append(record[key])
+
+    return {
+        "runs": len(records),
+        "succeeded": sum(1 for r in records if r.get("success")),
+        "end_to_end": stats([r["wall_ms"] for r in records if r.get("success")]),
+        "booking": stats([r["total_ms"] for r in records if r.get("success") and r.get("total_ms") is not None]),
+        "steps": {step: stats(values) for step, values in steps.items()},
+        "peak_rss_mb": round(max((r.get("peak_rss_kb", 0) for r in records), default=0) / 1024, 1),
+    }
+
+def _ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+def print_summary(summary, label=""):
+    print(f"\n{label or 'Benchmark'}: {summary['succeeded']}/{summary['runs']} bookings succeeded")
+    print(f"{'step':<26}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    rows = [("end_to_end", summary["end_to_end"]), ("booking", summary["booking"])]
+    rows += sorted(summary["steps"].items())
+    for name, s in rows:
+        print(f"{name:<26}{s['n']:>5}{_ms(s['p50']):>10}{_ms(s['p95']):>10}{_ms(s['mean']):>10}")
+    if summary.get("peak_rss_mb"):
+        print(f"peak RSS: {summary['peak_rss_mb']:.0f}MB")
+
+def _delta(before, after):
+    if before is None or after is None:
+        return "-"
+    if before == 0:
+        return "n/a"
+    return f"{100 * (after - before) / before:+.0f}%"
+
+def compare(before, after):
+    """
+    Prints p50/p95 of two saved results side by side, with the change.
+    """
+    print(f"\n{before.get('label') or 'before'} -> {after.get('label') or 'after'}")
+    print(f"{'step':<26}{'p50 before':>12}{'p50 after':>11}{'change':>8}{'p95 before':>12}{'p95 after':>11}{'change':>8}")
+    b, a = before["summary"], after["summary"]
+    names = ["end_to_end", "booking"] + sorted(set(b["steps"]) | set(a["steps"]))
+    empty = {"p50": None, "p95": None}
+    for name in names:
+        sb = b.get(name) if name in ("end_to_end", "booking") else b["steps"].get(name, empty)
+        sa = a.get(name) if name in ("end_to_end", "booking") else a["steps"].get(name, empty)
+        print(
+            f"{name:<26}{_ms(sb['p50']):>12}{_ms(sa['p50']):>11}{_delta(sb['p50'], sa['p50']):>8}"
+            f"{_ms(sb['p95']):>12}{_ms(sa['p95']):>11}{_delta(sb['p95'], sa['p95']):>8}"
+        )
+    rss_b, rss_a = b.get("peak_rss_mb"), a.get("peak_rss_mb")
+    print(f"{'peak RSS MB':<26}{_ms(rss_b):>12}{_ms(rss_a):>11}{_delta(rss_b, rss_a):>8}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the booking flow against the local mock site.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--engine", choices=["selenium", "http"], default="selenium")
+    parser.add_argument("--profile", choices=DRIVER_PROFILES, default=DRIVER_PROFILE)
+    parser.add_argument("--vehicles", type=int, default=1, help="Vehicles booked at the same time per run.")
+    parser.add_argument("--mode", choices=["process", "tabs"], default="process",
+                        help="A Chrome per vehicle, or every vehicle as a tab of one Chrome.")
+    parser.add_argument("--persistent-profile", action="store_true",
+                        help="Keep each Chrome's profile (disk cache, cookies) between runs.")
+    parser.add_argument("--latency", type=float, default=0, metavar="SECONDS",
+                        help="Mock server delay per response.")
+    parser.add_argument("--jitter", type=float, default=0, metavar="SECONDS",
+                        help="Extra random mock server delay per response, up to this much.")
+    parser.add_argument("--sold-out-for", type=float, default=0, metavar="SECONDS",
+                        help="Keep Standard Parking sold out for this long at the start of each run.")
+    parser.add_argument("--workdir", metavar="DIR",
+                        help="Keep bookings, traces and profiles here instead of a removed scratch directory.")
+    parser.add_argument("--label", help="Name for this run in saved results and comparisons.")
+    parser.add_argument("--save", metavar="FILE", help="Write runs and summary as JSON.")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two saved results instead of running.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        compare(before, after)
+    else:
+        records = run_benchmark(args.runs, args.engine, args.profile, args.latency, args.jitter, args.sold_out_for,
+                                workdir=args.workdir, vehicles=args.vehicles, mode=args.mode,
+                                persistent_profile=args.persistent_profile)
+        summary = summarise(records)
+        label = args.label or f"{args.engine}/{args.mode} x{args.vehicles} {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        print_summary(summary, label)
+        if args.save:
+            settings = {k: getattr(args, k) for k in ("runs", "engine", "profile", "latency", "jitter", "sold_out_for",
+                                                      "vehicles", "mode", "persistent_profile")}
+            with open(args.save, "w") as f:
+                json.dump({"label": label, "settings": settings, "summary": summary, "runs": records}, f, indent=2)
+            print(f"Saved to {args.save}")
@@ -1,52 +1,230 @@
 # booking.py
 
 import logging
+import os
+import socket
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from selenium.webdriver.common.by import By
-from driver_utils import wait_for_element
-from selenium.common.exceptions import TimeoutException
+from driver_utils import cookie_params, fill_fields, is_driver_alive, wait_for_element, wait_for_page_load
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from config import current_datetime, PARKING_DETAILS, USER_DETAILS_LIST
+from config import (
+    PARKING_DETAILS, USER_DETAILS_LIST, AVAILABILITY_MAX_INTERVAL, LEDGER_FILE,
+    BATCH_FORM_FILL, BATCH_DAYS_AHEAD, BOOKING_CLAIM_TTL, parking_details_for, booking_details_for,
+)
+from failures import (
+    BookingFailure, TransientFailure, CapacityFailure, PermanentFailure, RetryBudget, CAPACITY, PERMANENT, classify,
+)
+from ledger import BookingLedger, BOOKED, BUSY, CLAIMED, idempotency_key
+from availability import shared_watcher
+from selector_cache import resolve
+from tracing import span, tracing
+from waits import BookingWaits, value_is, any_present, element_clickable, all_of
 
 logger = logging.getLogger(__name__)
 
-def retry_parking_selection(driver):
+BOOK_NOW_SELECTORS = [
+    (By.CSS_SELECTOR, "button.btn.btn-primary[type='submit']"),
+    (By.CSS_SELECTOR, "input.btn.btn-primary[type='submit']"),
+    (By.CSS_SELECTOR, "input[value='Book Now']"),
+    (By.CSS_SELECTOR, "button.btn-primary"),
+    (By.XPATH, "//button[text()='Book Now']"),
+    (By.XPATH, "//input[@value='Book Now']"),
+    (By.XPATH, "//button[contains(@class, 'btn-primary')]")
+]
+
+BOOKING_REFERENCE_SELECTORS = [
+    (By.XPATH, "//h2[contains(text(), 'Booking Reference:')]"),
+    (By.XPATH, "//div[contains(text(), 'Booking Reference:')]"),
+    (By.XPATH, "//p[contains(text(), 'Booking Reference:')]")
+]
+
+# Elements that show the product list has rendered after "Book Now"
+PRODUCT_LIST_LOCATORS = (
+    (By.CSS_SELECTOR, "div.item__soldout"),
+    (By.CSS_SELECTOR, "a.item__cta[data-step2-item]"),
+)
+
+CONFIRMATION_XPATH = "//h1[contains(text(), 'Confirmation')]"
+
+# Stages of the booking flow, in order; a failed booking is retried from its stage
+BOOKING_STAGES = ("dates", "product", "details", "terms", "submit", "confirmation")
+
+# Stages after which a checkpoint (page URL and cookies) is recorded
+CHECKPOINT_STAGES = ("dates", "product", "details", "terms")
+
+# Stages whose work lives only in the open page's form; a reloaded page
+# starts again from the first of them
+FORM_STAGES = ("details", "terms", "submit")
+
+# What is on screen at each stage (details, terms and submit share one page)
+STAGE_PAGES = {
+    "dates": ((By.ID, "changeEntryDate"),),
+    "product": PRODUCT_LIST_LOCATORS,
+    "details": ((By.ID, "firstName"),),
+    "terms": ((By.ID, "terms"),),
+    "submit": ((By.ID, "PaymentFormSubmit"),),
+    "confirmation": ((By.XPATH, CONFIRMATION_XPATH),),
+}
+
+# Longest a single attempt waits for sold-out Standard Parking (seconds)
+SOLD_OUT_WAIT = 30 * 60
+
+BOOKING_REFERENCE_FILE = "/Users/admin/pip_install/booking_reference.txt"
+
+# Parallel bookings share BOOKING_REFERENCE_FILE; keep each record's lines together
+_booking_file_lock = threading.Lock()
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
     """
-    Retry selecting the parking option for up to 30 minutes if sold out.
+    The booking ledger, opened on first use.
     """
-    logger.info("Retrying Standard Parking selection for up to 30 minutes...")
-    end_time = datetime.now() + timedelta(minutes=30)
-    while datetime.now() < end_time:
-        if not check_sold_out(driver):
-            logger.info("Standard Parking is now available!")
-            return True
-        
-        logger.info("Standard Parking still sold out. Going back and retrying...")
-        driver.back()
-        time.sleep(5)
-        driver.refresh()
-        time.sleep(10)
-    
-    logger.error("Standard Parking remained sold out after 30 minutes of retrying.")
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = BookingLedger(LEDGER_FILE)
+        return _ledger
+
+def parking_date_of(parking_details):
+    """
+    The entry date of parking_details as YYYY-MM-DD.
+    """
+    return datetime.strptime(parking_details['entry_date'], "%d/%m/%Y").strftime("%Y-%m-%d")
+
+def booking_key(user_details, parking_details):
+    return idempotency_key(user_details['vehicle_reg'], parking_date_of(parking_details))
+
+def claim_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+def claim_booking(user_details, parking_details):
+    """
+    Claims this vehicle/date in the ledger before booking it. Returns
+    (CLAIMED, BOOKED or BUSY, key, owner). If the ledger cannot be reached
+    the booking goes ahead unclaimed.
+    """
+    key, owner = booking_key(user_details, parking_details), claim_owner()
+    try:
+        status = get_ledger().claim(key, owner, BOOKING_CLAIM_TTL)
+    except Exception as e:
+        logger.error(f"Could not claim {key} in the ledger, booking without a claim: {str(e)}")
+        return CLAIMED, key, owner
+    if status == BOOKED:
+        logger.info(f"{key} is already booked; nothing to do.")
+    elif status == BUSY:
+        logger.warning(f"{key} is being booked by another run; not booking it again.")
+    return status, key, owner
+
+@contextmanager
+def claim_heartbeat(key, owner, ttl=BOOKING_CLAIM_TTL):
+    """
+    Renews owner's claim on key every third of ttl while the block runs, so
+    a booking that outlasts ttl (e.g. a long sold-out wait) is never taken
+    over as stale by another run.
+    """
+    stopped = threading.Event()
+
+    def _beat():
+        while not stopped.wait(ttl / 3):
+            try:
+                if not get_ledger().renew_claim(key, owner):
+                    logger.warning(f"Claim on {key} is no longer held by {owner}.")
+            except Exception as e:
+                logger.warning(f"Could not renew claim on {key}: {str(e)}")
+
+    thread = threading.Thread(target=_beat, name=f"claim-{key}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+
+def release_booking_claim(key, owner):
+    try:
+        get_ledger().release_claim(key, owner)
+    except Exception as e:
+        logger.error(f"Could not release claim on {key}: {str(e)}")
+
+def retry_parking_selection(driver, waits=None, watcher=None, parking_details=PARKING_DETAILS, timeout=None):
+    """
+    Retry selecting the parking option for up to 30 minutes (or timeout
+    seconds, if less) if sold out.
+    Rather than polling from this browser, waits on the shared availability
+    watcher (see availability.py) and only reloads once it reports parking free.
+    Falls back to reloading every cycle if the watcher cannot probe the site;
+    the watcher is restarted on every cycle, so it can recover.
+    Time spent waiting here does not count against the booking's latency budget.
+    """
+    if watcher is None:
+        with shared_watcher(parking_details) as watcher:
+            return retry_parking_selection(driver, waits, watcher, parking_details, timeout)
+    waits = waits or BookingWaits()
+    limit = SOLD_OUT_WAIT if timeout is None else min(timeout, SOLD_OUT_WAIT)
+    logger.info(f"Retrying Standard Parking selection for up to {limit / 60:.0f} minutes...")
+    end_time = datetime.now() + timedelta(seconds=limit)
+    with waits.unbudgeted():
+        while datetime.now() < end_time:
+            if not check_sold_out(driver):
+                logger.info("Standard Parking is now available!")
+                return True
+
+            logger.info("Standard Parking still sold out. Waiting for the availability watcher...")
+            remaining = (end_time - datetime.now()).total_seconds()
+            if not watcher.wait_until_available(timeout=max(remaining, 0)):
+                if not watcher.failed:
+                    break
+                # No shared probe available; poll from this browser at the slowest watcher rate
+                time.sleep(min(AVAILABILITY_MAX_INTERVAL, max((end_time - datetime.now()).total_seconds(), 0)))
+
+            logger.info("Reloading the product list...")
+            try:
+                reload_product_list(driver, waits, parking_details)
+            except Exception as e:
+                logger.warning(f"Could not reload the product list: {str(e)}")
+
+    logger.error(f"Standard Parking remained sold out after {limit / 60:.0f} minutes of retrying.")
     return False
 
-def validate_booking_time():
+def reload_product_list(driver, waits, parking_details=PARKING_DETAILS):
+    """
+    Shows a fresh product list by going back to the date form and submitting
+    the dates again. Refreshing the list would re-post the form, and loading
+    the form URL lands on the date form, not the list.
+    Returns True once the product list is showing.
+    """
+    driver.back()
+    if not waits.settle(driver, "retry_back", any_present((By.ID, "changeEntryDate"))):
+        return False
+    set_booking_dates(driver, waits, parking_details)
+    return click_book_now(driver, waits) and any_present(*PRODUCT_LIST_LOCATORS)(driver)
+
+def validate_booking_time(parking_details=PARKING_DETAILS):
     """
     Validate that the booking meets time restrictions.
     For example, ensure entry date is in the future.
     """
-    entry_date_str = PARKING_DETAILS['entry_date']  # "dd/mm/yyyy"
+    entry_date_str = parking_details['entry_date']  # "dd/mm/yyyy"
     entry_datetime = datetime.strptime(f"{entry_date_str} 06:00", "%d/%m/%Y %H:%M")
+    # Not config.current_datetime: a resident daemon outlives the day it was imported on
+    today = datetime.now().date()
 
-    logger.info(f"Validating booking date: Entry {entry_datetime.date()}, Now {current_datetime.date()}")
+    logger.info(f"Validating booking date: Entry {entry_datetime.date()}, Now {today}")
 
-    if entry_datetime.date() < current_datetime.date():
-        raise ValueError(f"Entry date must be in the future. Current date is {current_datetime.date()}")
+    if entry_datetime.date() < today:
+        raise ValueError(f"Entry date must be in the future. Current date is {today}")
 
     logger.info("Booking date validation passed.")
 
+# Shown on the date form when pre-booking has not opened yet
+PREBOOKING_ALERT = (By.CSS_SELECTOR, "div.alert.alert-danger p[role='alert']")
+
 def select_dates(driver, booking_data):
     """
     Select/Enter the entry and exit dates on the booking page.
@@ -54,125 +232,132 @@ def select_dates(driver, booking_data):
     """
     logger.info("Selecting booking dates from BOOKING_DETAILS...")
 
-    entry_date_input = wait_for_element(driver, By.ID, "entryDate", timeout=5)
-    if entry_date_input:
-        entry_date_input.clear()
-        entry_date_input.send_keys(booking_data["entry_date"])
+    # Optional inputs the current page does not have (set_booking_dates fills
+    # changeEntryDate/changeExitDate): look once instead of waiting for them
+    entry_date_inputs = driver.find_elements(By.ID, "entryDate")
+    if entry_date_inputs:
+        entry_date_inputs[0].clear()
+        entry_date_inputs[0].send_keys(booking_data["entry_date"])
         logger.info(f"Entered entry date: {booking_data['entry_date']}")
 
-    exit_date_input = wait_for_element(driver, By.ID, "exitDate", timeout=5)
-    if exit_date_input:
-        exit_date_input.clear()
-        exit_date_input.send_keys(booking_data["exit_date"])
+    exit_date_inputs = driver.find_elements(By.ID, "exitDate")
+    if exit_date_inputs:
+        exit_date_inputs[0].clear()
+        exit_date_inputs[0].send_keys(booking_data["exit_date"])
         logger.info(f"Entered exit date: {booking_data['exit_date']}")
 
-def fill_parking_details(driver, user_details):
+def enter_dates(driver, waits, gate=None, parking_details=PARKING_DETAILS):
     """
-    Attempts to fill out the parking details form and proceed through the booking steps.
-    Includes logic for handling "Book Now" button, sold-out checks, etc.
+    "dates" stage: sets the dates on the date form and clicks "Book Now",
+    ending on the product list.
     """
     logger.info("Starting to fill parking details...")
 
-    # Check for immediate error indicating pre-booking not available
-    try:
-        error_message = wait_for_element(
-            driver, By.CSS_SELECTOR, "div.alert.alert-danger p[role='alert']",
-            timeout=3
-        )
-        if error_message and "Pre-booking parking at Unity Place is coming soon" in error_message.text:
-            logger.error(f"ERROR: {error_message.text}")
-            logger.error("Cannot proceed - pre-booking is not available for the selected dates.")
-            return False
-    except:
-        pass  # no error found, keep going
-
-    time.sleep(5)  # Wait for the form to finish loading
-
-    # Try to set entry/exit dates with JS (some sites need this approach)
+    # Wait for the form to finish loading, then check once for an error
+    # indicating pre-booking is not available: the alert is rendered with
+    # the form, so there is no point waiting for one that is normally absent
+    with span("prebooking_check"):
+        waits.settle(driver, "form_ready", any_present((By.ID, "changeEntryDate"), PREBOOKING_ALERT))
+        error_messages = driver.find_elements(*PREBOOKING_ALERT)
     try:
-        entry_date_element = wait_for_element(driver, By.ID, "changeEntryDate", timeout=5)
-        if entry_date_element:
-            driver.execute_script(
-                f"arguments[0].value = '{PARKING_DETAILS['entry_date']}'", 
-                entry_date_element
-            )
-            driver.execute_script("arguments[0].dispatchEvent(new Event('change'))", entry_date_element)
-            logger.info(f"Entry date set to {PARKING_DETAILS['entry_date']} via JS")
-
-        time.sleep(2)
-    
-        entry_time_element = wait_for_element(driver, By.ID, "changeEntryTime", timeout=5)
-        if entry_time_element:
-            driver.execute_script("arguments[0].value = '06:00'", entry_time_element)
-            driver.execute_script("arguments[0].dispatchEvent(new Event('change'))", entry_time_element)
-            logger.info("Entry time set to 06:00 via JS")
-
-        exit_date_element = wait_for_element(driver, By.ID, "changeExitDate", timeout=5)
-        if exit_date_element:
-            driver.execute_script(
-                f"arguments[0].value = '{PARKING_DETAILS['exit_date']}'", 
-                exit_date_element
-            )
-            driver.execute_script("arguments[0].dispatchEvent(new Event('change'))", exit_date_element)
-            logger.info(f"Exit date set to {PARKING_DETAILS['exit_date']} via JS")
+        closed = error_messages and "Pre-booking parking at Unity Place is coming soon" in error_messages[0].text
+    except Exception:
+        closed = False  # the alert went away, keep going
+    if closed:
+        logger.error(f"ERROR: {error_messages[0].text}")
+        raise PermanentFailure("Pre-booking is not available for the selected dates.")
 
-    except Exception as e:
-        logger.error(f"Could not set entry/exit dates with JS: {str(e)}")
-        return False
-
-    time.sleep(2)
+    with span("set_dates"):
+        set_booking_dates(driver, waits, parking_details)
 
     # Click "Book Now" or "Search" button to continue
-    if not click_book_now(driver):
-        return False
-
-    # Check whether standard parking is sold out
-    if check_sold_out(driver):
-        # Attempt to book TAP Permit instead
-        if not click_tap_permit_booking(driver):
-            return False
-    else:
-        # Not sold out, try standard parking flow
-        if not click_standard_parking(driver):
-            return False
+    with span("click_book_now"):
+        if not click_book_now(driver, waits, gate):
+            raise TransientFailure("Could not click 'Book Now'.")
 
+def set_booking_dates(driver, waits, parking_details=PARKING_DETAILS):
+    """
+    Sets the entry and exit dates on the date form, which the caller has
+    waited for. Raises TransientFailure if they do not stick.
+    """
+    # Set entry/exit dates with JS (some sites need this approach)
+    try:
+        date_values = {
+            "changeEntryDate": parking_details['entry_date'],
+            "changeEntryTime": "06:00",
+            "changeExitDate": parking_details['exit_date'],
+        }
+        entered = fill_form(driver, date_values, waits)
+    except Exception as e:
+        raise TransientFailure(f"Could not set entry/exit dates with JS: {str(e)}") from e
+
+    for field_id, value in entered.items():
+        if value is not None:
+            logger.info(f"{field_id} set to {value} via JS")
+    missing = unfilled_fields(entered, date_values, ("changeEntryDate", "changeExitDate"))
+    if missing:
+        raise TransientFailure(f"Dates not set: {', '.join(missing)}")
+    waits.settle(driver, "date_set", all_of(*(
+        value_is((By.ID, field_id), date_values[field_id])
+        for field_id, value in entered.items() if value is not None
+    )))
+
+def choose_product(driver, waits, parking_details=PARKING_DETAILS, sold_out_timeout=None):
+    """
+    "product" stage: picks TAP or Standard Parking from the product list,
+    ending on the details form. Raises CapacityFailure if Standard Parking
+    stays sold out (for at most sold_out_timeout seconds, if given).
+    """
+    # Check whether standard parking is sold out; if TAP can't be booked
+    # instead, wait for Standard Parking to free up
+    with span("sold_out_check"):
+        tap_booked = check_sold_out(driver) and click_tap_permit_booking(driver)
+    if not tap_booked:
+        with span("select_product"):
+            if not click_standard_parking(driver, waits, parking_details, sold_out_timeout):
+                raise TransientFailure("Could not select Standard Parking.")
+
+def enter_user_details(driver, user_details, waits):
+    """
+    "details" stage: fills in the driver's details.
+    """
     logger.info("about to start entering persanal details")
     # Fill personal details
-    if not fill_user_details(driver, user_details):
-        logger.error(f"FAILED to fill user details for {user_details['vehicle_reg']}.")
-        return False
+    with span("fill_user_details"):
+        filled = fill_user_details(driver, user_details, waits)
+    if not filled:
+        raise TransientFailure(f"FAILED to fill user details for {user_details['vehicle_reg']}.")
 
-    # Accept T&Cs and finalize the booking
-    if not accept_terms_and_finalize(driver, user_details):
-        return False
-
-    return True
-
-def click_book_now(driver):
+def click_book_now(driver, waits=None, gate=None):
     """
     Tries various selectors to find a "Book Now" button and clicks it.
+    With a gate, the button is located first and the click waits for the release time.
     """
+    waits = waits or BookingWaits()
     logger.info("Looking for a 'Book Now' button...")
-    button_selectors = [
-        (By.CSS_SELECTOR, "button.btn.btn-primary[type='submit']"),
-        (By.CSS_SELECTOR, "input.btn.btn-primary[type='submit']"),
-        (By.CSS_SELECTOR, "input[value='Book Now']"),
-        (By.CSS_SELECTOR, "button.btn-primary"),
-        (By.XPATH, "//button[text()='Book Now']"),
-        (By.XPATH, "//input[@value='Book Now']"),
-        (By.XPATH, "//button[contains(@class, 'btn-primary')]")
-    ]
-
-    for selector_type, selector_value in button_selectors:
-        btn = wait_for_element(driver, selector_type, selector_value, timeout=2, clickable=True)
-        if btn:
-            try:
-                btn.click()
-                logger.info(f"Clicked 'Book Now' using {selector_type}={selector_value}")
-                time.sleep(2)
-                return True
-            except Exception as e:
-                logger.warning(f"Failed to click button {selector_type}={selector_value}: {str(e)}")
+    candidates = list(BOOK_NOW_SELECTORS)
+
+    # All candidates are checked in one round trip; if the winner can't be
+    # clicked, try again without it
+    while candidates:
+        btn, selector = resolve(driver, "book_now", candidates, timeout=5, clickable=True)
+        if not btn:
+            break
+        selector_type, selector_value = selector
+        try:
+            if gate:
+                # Holding for the release time does not count against the latency budget
+                with waits.unbudgeted(), span("release_wait"):
+                    gate.wait()
+            btn.click()
+            if gate:
+                gate.record_click()
+            logger.info(f"Clicked 'Book Now' using {selector_type}={selector_value}")
+            waits.settle(driver, "book_now", any_present(*PRODUCT_LIST_LOCATORS))
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to click button {selector_type}={selector_value}: {str(e)}")
+            candidates.remove(selector)
     logger.error("Could not find any functioning 'Book Now' button.")
     return False
 
@@ -222,12 +407,14 @@ def click_tap_permit_booking(driver):
     logger.info("Sold out and didn book TAP")
     return False
 
-def click_standard_parking(driver):
+def click_standard_parking(driver, waits=None, parking_details=PARKING_DETAILS, sold_out_timeout=None):
     """
     Attempts to click on the Standard Parking 'Book Now' button, if it exists.
+    Raises CapacityFailure if it stays sold out.
     """
+    waits = waits or BookingWaits()
     logger.info("Selecting Standard Parking (pid=413)...")
-    if retry_parking_selection(driver):
+    if retry_parking_selection(driver, waits, parking_details=parking_details, timeout=sold_out_timeout):
         standard_parking_button = wait_for_element(
             driver,
             By.CSS_SELECTOR,
@@ -239,75 +426,104 @@ def click_standard_parking(driver):
             try:
                 standard_parking_button.click()
                 logger.info("Clicked 'Standard Parking' book button.")
-                time.sleep(2)
+                waits.settle(driver, "product_selected", any_present((By.ID, "firstName")))
                 return True
             except Exception as e:
                 logger.error(f"Failed clicking Standard Parking button: {str(e)}")
         else:
             logger.error("Standard Parking button not found.")
     else:
-        logger.error("Could not select Standard Parking after retries.")
+        raise CapacityFailure("Standard Parking still sold out after retries.")
     return False
 
-def fill_user_details(driver, user_details):
+def type_into_field(driver, field_id, value, waits):
+    """
+    Per-key fallback for fields that reject programmatic input: click, clear,
+    send_keys. Returns the value read back, or None if the field is missing.
+    """
+    element = wait_for_element(driver, By.ID, field_id, timeout=5)
+    if not element:
+        return None
+    element.click()
+    waits.settle(
+        driver, "typing_focus",
+        lambda d: d.execute_script("return document.activeElement === arguments[0]", element)
+    )
+    element.clear()
+    waits.settle(driver, "typing_clear", value_is((By.ID, field_id), ""))
+    element.send_keys(value)
+    waits.settle(driver, "typing_set", value_is((By.ID, field_id), value))
+    return element.get_attribute("value")
+
+def fill_form(driver, values, waits):
+    """
+    Sets every field in values ({element id: value}) with one batched script
+    call, then types into any field whose value did not stick. With
+    BATCH_FORM_FILL off, or if the batched script fails, every field is typed.
+    Returns {element id: value read back, or None if the field is missing}.
+    """
+    batched = fill_fields(driver, values) if BATCH_FORM_FILL else None
+    if BATCH_FORM_FILL and batched is None:
+        logger.warning("Batched form fill failed; typing every field instead.")
+    entered = dict(batched or {})
+    for field_id, value in values.items():
+        if batched is not None and field_id in batched and batched[field_id] is None:
+            logger.warning(f"Field '{field_id}' not found on the page.")
+            continue
+        if entered.get(field_id) != value:
+            if batched is not None:
+                logger.warning(f"Field '{field_id}' rejected programmatic input; typing it instead.")
+            entered[field_id] = type_into_field(driver, field_id, value, waits)
+    return entered
+
+def unfilled_fields(entered, values, required):
+    """
+    The required fields that are missing from the page or did not take their value.
+    """
+    return [field_id for field_id in required if entered.get(field_id) != values[field_id]]
+
+def fill_user_details(driver, user_details, waits=None):
     """
     Fill in the user details on the form for each vehicle.
     """
+    waits = waits or BookingWaits()
     logger.info(f"Filling details for {user_details['vehicle_reg']}...")
 
-    # First Name
-    first_name_el = wait_for_element(driver, By.ID, "firstName", timeout=5)
-    if first_name_el:
-        first_name_el.clear()
-        first_name_el.send_keys(user_details["first_name"])
-        logger.info(f"Entered first name: {user_details['first_name']}")
-        time.sleep(1)
-
-    # Last Name
-    last_name_el = wait_for_element(driver, By.ID, "lastName", timeout=5)
-    if last_name_el:
-        last_name_el.clear()
-        last_name_el.send_keys(user_details["last_name"])
-        logger.info(f"Entered last name: {user_details['last_name']}")
-        time.sleep(1)
-
-    # Email
-    email_el = wait_for_element(driver, By.ID, "email", timeout=5)
-    if email_el:
-        email_el.clear()
-        email_el.send_keys(user_details["email"])
-        logger.info(f"Entered email: {user_details['email']}")
-        time.sleep(1)
-
-    # Vehicle Registration
-    vehicle_reg_el = wait_for_element(driver, By.ID, "registration", timeout=5)
-    if vehicle_reg_el:
-        try:
-            vehicle_reg_el.click()
-            logger.info("Clicked vehicle registration input field.")
-            time.sleep(2)
-            vehicle_reg_el.clear()
-            time.sleep(1)
-            vehicle_reg_el.send_keys(user_details["vehicle_reg"])
-            logger.info(f"Entered vehicle reg: {user_details['vehicle_reg']}")
-            time.sleep(2)
-
-            # Verify the text that was entered
-            entered_text = vehicle_reg_el.get_attribute("value")
-            if not entered_text or entered_text != user_details["vehicle_reg"]:
-                logger.error("Failed to confirm entered vehicle registration text.")
-                return False
-            logger.info("Vehicle registration confirmed.")
-        except Exception as e:
-            logger.error(f"Error filling vehicle registration: {str(e)}")
-            return False
+    # Wait for the details form before filling it
+    wait_for_element(driver, By.ID, "firstName", timeout=5)
+    values = {
+        "firstName": user_details["first_name"],
+        "lastName": user_details["last_name"],
+        "email": user_details["email"],
+        "registration": user_details["vehicle_reg"],
+    }
+
+    try:
+        entered = fill_form(driver, values, waits)
+    except Exception as e:
+        logger.error(f"Error filling user details: {str(e)}")
+        return False
+
+    for field_id, value in entered.items():
+        if value is not None:
+            logger.info(f"Entered {field_id}: {value}")
+    waits.settle(driver, "field_set", all_of(*(
+        value_is((By.ID, field_id), values[field_id])
+        for field_id, value in entered.items() if value is not None
+    )))
+
+    # Every field is required; above all the vehicle registration
+    missing = unfilled_fields(entered, values, values)
+    if missing:
+        logger.error(f"Failed to confirm entered details: {', '.join(missing)}")
+        return False
+    logger.info("Vehicle registration confirmed.")
 
     return True
 
-def process_booking(driver, booking_data, user_details):
+def should_book_today(user_details):
     """
-    Process booking flow for a single vehicle.
-    Includes day-of-week toggles so booking occurs only if Book=Y and today's day is Y.
+    Day-of-week toggles: book only if Book=Y and today's day is Y.
     """
     # 7-day toggles: Monday=0 .. Sunday=6
     weekday_index = datetime.now().weekday()
@@ -324,53 +540,292 @@ def process_booking(driver, booking_data, user_details):
         logger.info(f"Skipping {user_details['vehicle_reg']} because {day_key.upper()} toggle is not 'Y'.")
         return False
 
-    try:
-        # Validate booking time
-        validate_booking_time()
+    return True
 
-        # Select dates (entry/exit)
-        select_dates(driver, booking_data)
+def process_booking(driver, booking_data, user_details, waits=None, gate=None, parking_details=PARKING_DETAILS,
+                    replace_driver=None):
+    """
+    Process booking flow for a single vehicle.
+    Includes day-of-week toggles so booking occurs only if Book=Y and today's day is Y.
+    waits controls how each step waits for the page (see waits.py); by default a
+    new BookingWaits with the configured profile and latency budget is used.
+    gate optionally holds the "Book Now" click until a release time (see scheduler.py).
+    replace_driver(dead_driver) returns a new driver if the browser crashes
+    mid-booking; the booking then resumes from its last checkpoint.
+    """
+    if not should_book_today(user_details):
+        return False
+    return book_date(driver, booking_data, user_details, parking_details, waits, gate, replace_driver)
 
-        # Fill in the rest of the parking details (Book Now, user details, etc.)
-        if not fill_parking_details(driver, user_details):
-            raise Exception("Failed to fill parking details.")
+def booking_dates(user_details, days=BATCH_DAYS_AHEAD, today=None):
+    """
+    Parking dates in the next days days (from tomorrow) that daily runs would
+    book for this user. A daily run on day D books D+1 when D's toggle is Y,
+    so each date is included when the toggle for the day before it is Y.
+    """
+    if user_details.get("Book") != "Y":
+        return []
+    weekdays = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+    today = today or datetime.now().date()
+    dates = []
+    for offset in range(1, days + 1):
+        day = today + timedelta(days=offset)
+        run_day = day - timedelta(days=1)
+        if user_details.get(weekdays[run_day.weekday()], "N") == "Y":
+            dates.append(day)
+    return dates
+
+def process_booking_dates(driver, user_details, dates, waits_factory=BookingWaits, replace_driver=None):
+    """
+    Books each date in dates (datetime.date) one after another in the same
+    browser session, returning to the date form between bookings instead of
+    starting a new browser. driver must already be on the date form.
+    Each date gets its own latency budget from waits_factory().
+    replace_driver is as for process_booking(); later dates use the replacement.
+    Returns {"YYYY-MM-DD": True/False}.
+    """
+    def _replace(dead):
+        nonlocal driver
+        driver = replace_driver(dead)
+        return driver
+
+    form_url = driver.current_url
+    results = {}
+    for i, day in enumerate(dates):
+        key = day.strftime("%Y-%m-%d")
+        if i:
+            logger.info(f"Returning to the date form for {key}...")
+            driver.get(form_url)
+            if not wait_for_page_load(driver):
+                logger.error(f"Date form did not load for {key}.")
+                results[key] = False
+                continue
+        logger.info(f"Booking {user_details['vehicle_reg']} for {key} ({i + 1}/{len(dates)})...")
+        results[key] = book_date(
+            driver, booking_details_for(day), user_details, parking_details_for(day), waits_factory(),
+            replace_driver=_replace if replace_driver else None,
+        )
+    booked = sum(1 for ok in results.values() if ok)
+    logger.info(f"{user_details['vehicle_reg']}: booked {booked}/{len(results)} dates: {results}")
+    return results
 
-        logger.info("Completed fill_parking_details...")
+def book_date(driver, booking_data, user_details, parking_details, waits=None, gate=None, replace_driver=None):
+    """
+    Runs the booking steps for one set of dates, timing each step.
+    """
+    status, key, owner = claim_booking(user_details, parking_details)
+    if status != CLAIMED:
+        return status == BOOKED
 
-        # Accept T&Cs and finalize booking
-        terms = wait_for_element(driver, By.ID, "terms", timeout=5)
-        if terms:
-            driver.execute_script("arguments[0].scrollIntoView(true);", terms)
-            time.sleep(1)
-            terms.click()
-            logger.info("Clicked terms and conditions checkbox.")
-        else:
-            logger.error("Could not find terms checkbox.")
-            return False
+    waits = waits or BookingWaits()
+    logger.info(f"Using '{waits.profile}' wait profile with a {waits.budget}s latency budget.")
 
-        book_button = wait_for_element(driver, By.ID, "PaymentFormSubmit", timeout=5, clickable=True)
-        if book_button:
-            book_button.click()
-            logger.info("Clicked 'Book and Pay'.")
-        else:
-            logger.error("Could not find 'Book and Pay' button.")
-            return False
+    # Every step is timed; the spans are written out when the booking ends (see tracing.py)
+    progress = {}
+    with tracing(user_details['vehicle_reg'], booking_date=parking_details['entry_date']) as trace:
+        success = False
+        try:
+            with claim_heartbeat(key, owner):
+                success = run_with_retries(
+                    driver, booking_data, user_details, waits, gate, parking_details, progress, replace_driver
+                )
+        finally:
+            trace.finish(success)
+            if not success:
+                if progress.get("submitted"):
+                    # 'Book and Pay' was clicked, so the booking may exist; the claim
+                    # blocks other runs until BOOKING_CLAIM_TTL rather than risk a second one
+                    logger.error(f"{key}: submitted but not confirmed; check before rebooking.")
+                else:
+                    release_booking_claim(key, owner)
+    return success
+
+def run_with_retries(driver, booking_data, user_details, waits, gate=None, parking_details=PARKING_DETAILS,
+                     progress=None, replace_driver=None):
+    """
+    run_booking_steps(), retried according to the failure's class (see
+    failures.py). A retry resumes at the stage that failed while its page is
+    still showing; the date form is only reloaded when nothing later is.
+    If the browser has died, replace_driver(driver) supplies a new one and
+    the booking resumes from progress["checkpoint"] (see restore_checkpoint()).
+    progress["failures"] lists every failure as {"stage", "kind", "error"}.
+    """
+    progress = {} if progress is None else progress
+    try:
+        with span("validate"):
+            validate_booking_time(parking_details)
+    except ValueError as e:
+        logger.error(f"Not booking ({PERMANENT}): {e}")
+        progress.setdefault("failures", []).append({"stage": "validate", "kind": PERMANENT, "error": str(e)})
+        return False
 
-        # Wait for confirmation page
+    form_url = driver.current_url
+    retries = RetryBudget()
+    stage = BOOKING_STAGES[0]
+    while True:
         try:
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.XPATH, "//h1[contains(text(), 'Confirmation')]"))
+            # After a capacity failure, further sold-out waits share what is left of its budget
+            return run_booking_steps(
+                driver, booking_data, user_details, waits, gate, parking_details, progress, stage,
+                sold_out_timeout=retries.remaining(CAPACITY),
             )
-        except TimeoutException:
-            logger.error("Booking confirmation not received (Timeout).")
-            return False
+        except Exception as e:
+            kind = classify(e)
+            failed = progress.get("stage", stage)
+            progress.setdefault("failures", []).append({"stage": failed, "kind": kind, "error": str(e)})
+            delay = retries.next_delay(kind)
+            if delay is None:
+                logger.error(f"Stage '{failed}' failed ({kind}): {e}. Giving up after "
+                             f"{retries.failures[kind]} {kind} failure(s).")
+                return False
+            logger.warning(f"Stage '{failed}' failed ({kind}): {e}. Retrying in {delay:.1f}s.")
+            with span("retry_backoff"):
+                time.sleep(delay)
+            # Each attempt gets the full latency budget; the retry policy bounds the total
+            waits.restart()
+            if is_driver_alive(driver):
+                stage = resume_stage(driver, failed, form_url, progress.get("submitted"))
+            elif replace_driver and not progress.get("submitted"):
+                logger.warning("Browser session lost; continuing in a replacement driver.")
+                try:
+                    driver = replace_driver(driver)
+                    stage = restore_checkpoint(driver, progress.get("checkpoint"), failed, form_url)
+                except Exception as e:
+                    logger.error(f"Could not continue in a replacement driver: {str(e)}")
+                    stage = None
+            else:
+                # After 'Book and Pay' a new browser could not tell whether the booking went through
+                logger.error("Browser session lost; cannot resume.")
+                stage = None
+            if stage is None:
+                return False
+            logger.info(f"Resuming at stage '{stage}'.")
 
-        # Attempt to extract booking reference
-        return extract_booking_reference(driver, user_details)
+def current_stage(driver, up_to=BOOKING_STAGES[-1]):
+    """
+    The furthest stage, up to and including up_to, whose page is showing; None if none is.
+    """
+    for stage in reversed(BOOKING_STAGES[:BOOKING_STAGES.index(up_to) + 1]):
+        if any_present(*STAGE_PAGES[stage])(driver):
+            return stage
+    return None
 
-    except Exception as e:
-        logger.error(f"Error during booking process: {e}")
-        return False
+def save_checkpoint(driver, progress, stage):
+    """
+    Records in progress["checkpoint"] that stage is done, with the page the
+    flow is on and the session's cookies.
+    """
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getCookies", {}).get("cookies", [])
+        progress["checkpoint"] = {"stage": stage, "url": driver.current_url, "cookies": cookies}
+        logger.info(f"Checkpoint after '{stage}': {progress['checkpoint']['url']} ({len(cookies)} cookies)")
+    except WebDriverException as e:
+        logger.warning(f"Could not record checkpoint after '{stage}': {str(e)}")
+
+def restore_checkpoint(driver, checkpoint, failed, form_url):
+    """
+    Puts a replacement driver where checkpoint left off: restores its cookies,
+    opens its page and returns the stage to resume at (never past failed).
+    Form values are not carried over, so a restored details page is filled
+    in again. Without a checkpoint the booking starts from form_url.
+    """
+    with span("restore_checkpoint"):
+        if checkpoint:
+            cookies = [cookie_params(cookie) for cookie in checkpoint["cookies"]]
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+            driver.get(checkpoint["url"])
+            if wait_for_page_load(driver):
+                up_to = FORM_STAGES[0] if failed in FORM_STAGES else failed
+                stage = current_stage(driver, up_to)
+                if stage:
+                    logger.info(f"Restored checkpoint after '{checkpoint['stage']}' in the replacement driver.")
+                    return stage
+            logger.warning(f"Checkpoint page {checkpoint['url']} did not come back; starting from the date form.")
+        driver.get(form_url)
+        wait_for_page_load(driver)
+        return BOOKING_STAGES[0]
+
+def resume_stage(driver, failed, form_url, submitted=False):
+    """
+    Where a retry after a failure in stage failed starts: failed itself,
+    or the furthest earlier stage still on screen, or the date form reloaded
+    from form_url. Once 'Book and Pay' has been clicked only the confirmation
+    is retried, so a booking is never submitted twice. None if the browser
+    no longer answers.
+    """
+    if submitted:
+        return "confirmation"
+    try:
+        # After a capacity failure the product stage reloads the list itself (retry_parking_selection)
+        stage = current_stage(driver, failed)
+        if stage is None:
+            logger.info("No booking page showing; reloading the date form...")
+            driver.get(form_url)
+            wait_for_page_load(driver)
+            stage = BOOKING_STAGES[0]
+        return stage
+    except WebDriverException as e:
+        logger.error(f"Browser session lost, cannot resume: {str(e)}")
+        return None
+
+def run_booking_steps(driver, booking_data, user_details, waits, gate=None, parking_details=PARKING_DETAILS,
+                      progress=None, start=BOOKING_STAGES[0], sold_out_timeout=None):
+    """
+    The stages of process_booking from start onwards, from the date form to
+    the booking reference. Raises a BookingFailure (or the WebDriver error)
+    if a stage fails; progress["stage"] is the stage that was running.
+    progress["checkpoint"] is updated after each of CHECKPOINT_STAGES, and
+    progress["submitted"] is set once 'Book and Pay' has been clicked.
+    """
+    progress = {} if progress is None else progress
+    for stage in BOOKING_STAGES[BOOKING_STAGES.index(start):]:
+        progress["stage"] = stage
+        if stage == "dates":
+            # Select dates (entry/exit)
+            with span("select_dates"):
+                select_dates(driver, booking_data)
+            enter_dates(driver, waits, gate, parking_details)
+        elif stage == "product":
+            choose_product(driver, waits, parking_details, sold_out_timeout)
+        elif stage == "details":
+            enter_user_details(driver, user_details, waits)
+            logger.info("Completed the booking details...")
+        elif stage == "terms":
+            # Accept T&Cs and finalize booking
+            with span("terms"):
+                terms = wait_for_element(driver, By.ID, "terms", timeout=5)
+                if not terms:
+                    raise TransientFailure("Could not find terms checkbox.")
+                driver.execute_script("arguments[0].scrollIntoView(true);", terms)
+                waits.settle(driver, "terms_visible", element_clickable((By.ID, "terms")))
+                terms.click()
+                logger.info("Clicked terms and conditions checkbox.")
+        elif stage == "submit":
+            with span("submit"):
+                book_button = wait_for_element(driver, By.ID, "PaymentFormSubmit", timeout=5, clickable=True)
+                if not book_button:
+                    raise TransientFailure("Could not find 'Book and Pay' button.")
+                book_button.click()
+                progress["submitted"] = True
+                logger.info("Clicked 'Book and Pay'.")
+        elif stage == "confirmation":
+            # Wait for confirmation page
+            try:
+                with span("confirmation_wait"):
+                    waits.check_budget()
+                    WebDriverWait(driver, min(30, waits.remaining())).until(
+                        EC.presence_of_element_located((By.XPATH, CONFIRMATION_XPATH))
+                    )
+            except TimeoutException as e:
+                raise TransientFailure("Booking confirmation not received (Timeout).") from e
+
+            # Attempt to extract booking reference
+            with span("extract_reference"):
+                if not extract_booking_reference(driver, user_details, parking_details):
+                    raise TransientFailure("Could not find booking reference on confirmation page.")
+        if stage in CHECKPOINT_STAGES:
+            save_checkpoint(driver, progress, stage)
+    return True
 
 def accept_terms_and_finalize(driver, user_details):
     """
@@ -380,37 +835,60 @@ def accept_terms_and_finalize(driver, user_details):
     logger.info("accept_terms_and_finalize is not used in process_booking now, but left for reference.")
     return True
 
-def extract_booking_reference(driver, user_details):
+def extract_booking_reference(driver, user_details, parking_details=PARKING_DETAILS):
     """
     Searches for a booking reference on the confirmation page and writes it to booking_reference.txt.
     """
     logger.info("Looking for booking reference on the confirmation page...")
-    possible_xpaths = [
-        "//h2[contains(text(), 'Booking Reference:')]",
-        "//div[contains(text(), 'Booking Reference:')]",
-        "//p[contains(text(), 'Booking Reference:')]"
-    ]
     booking_ref = None
 
-    for xpath in possible_xpaths:
+    ref_el, _ = resolve(driver, "booking_reference", BOOKING_REFERENCE_SELECTORS, timeout=2)
+    if ref_el:
         try:
-            ref_el = driver.find_element(By.XPATH, xpath)
-            if ref_el:
-                text_parts = ref_el.text.split("Reference:")
-                if len(text_parts) > 1:
-                    booking_ref = text_parts[1].strip()
-                    break
-        except:
-            continue
+            booking_ref = parse_booking_reference(ref_el.text)
+        except Exception as e:
+            logger.warning(f"Could not read booking reference element: {str(e)}")
 
     if booking_ref:
         logger.info(f"Booking confirmed! Reference: {booking_ref}")
-        with open("/Users/admin/pip_install/booking_reference.txt", "a") as f:
-            f.write(f"Booking Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f" BOOKED FOR {user_details['first_name']}\n")
-            f.write(f"Booking Reference: {booking_ref}\n")
-        logger.info("Booking reference saved to booking_reference.txt")
+        save_booking_reference(user_details, booking_ref, parking_details)
         return True
     else:
         logger.error("Could not find booking reference on confirmation page.")
         return False
+
+def parse_booking_reference(text):
+    """
+    Returns the reference following "Reference:" in text, or None.
+    """
+    text_parts = text.split("Reference:")
+    if len(text_parts) > 1:
+        return text_parts[1].strip() or None
+    return None
+
+def save_booking_reference(user_details, booking_ref, parking_details=PARKING_DETAILS):
+    """
+    Records a booking in the ledger (under its idempotency key) and appends
+    it to booking_reference.txt.
+    """
+    booked_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        get_ledger().record(
+            booking_ref, user_details['first_name'],
+            email=user_details.get('email'), vehicle_reg=user_details.get('vehicle_reg'),
+            booked_at=booked_at, parking_date=parking_date_of(parking_details),
+            idempotency_key=booking_key(user_details, parking_details),
+        )
+    except Exception as e:
+        # The text file below still has the booking; the dashboard merges it in on its next sync
+        logger.error(f"Could not record booking in the ledger: {str(e)}")
+
+    record = (
+        f"Booking Date: {booked_at}\n"
+        f" BOOKED FOR {user_details['first_name']}\n"
+        f"Booking Reference: {booking_ref}\n"
+    )
+    with _booking_file_lock:
+        with open(BOOKING_REFERENCE_FILE, "a") as f:
+            f.write(record)
+    logger.info("Booking reference saved to booking_reference.txt")
@@ -0,0 +1,156 @@
+# booking_file.py
+"""
+Incremental reader for booking_reference.txt.
+
+BookingFileTail remembers the byte offset it has parsed up to and only
+reads what was appended since. It keeps no records itself: callers store
+what refresh() returns (app.py merges it into the ledger) and can save
+state() alongside, so a restart resumes from the same offset instead of
+re-reading the whole file. Truncation and rotation (the path now pointing
+at a different file) are detected and trigger a clean re-read.
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Bytes from the start of the file used to notice it was replaced in place
+FINGERPRINT_SIZE = 64
+
+class RecordParser:
+    """
+    Line-at-a-time parser for the record shape written by save_booking_reference:
+
+        Booking Date: 2025-01-31 12:07:29
+         BOOKED FOR Pankaj
+        Booking Reference: ABC123
+
+    feed() returns a {"date", "name", "reference"} dict when a record completes.
+    """
+
+    def __init__(self):
+        self.record = {}
+
+    def feed(self, line):
+        line = line.strip()
+        if line.startswith("Booking Date:"):
+            self.record = {"date": line.split(":", 1)[1].strip()}
+        elif line.startswith("BOOKED FOR"):
+            self.record["name"] = line.split("BOOKED FOR", 1)[1].strip()
+        elif line.startswith("Booking Reference:"):
+            self.record["reference"] = line.split(":", 1)[1].strip()
+            record, self.record = self.record, {}
+            return record
+        return None
+
+def parse_booking_records(lines):
+    """
+    Yields one record per "Booking Reference:" line.
+    """
+    parser = RecordParser()
+    for line in lines:
+        record = parser.feed(line)
+        if record:
+            yield record
+
+class BookingFileTail:
+    """
+    Thread-safe incremental view of a booking file. Call refresh() to pick up
+    appended bytes; it returns only the records that are new since the last call.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+        if state:
+            self._restore(state)
+
+    def _reset(self):
+        self.offset = 0
+        self.identity = None
+        self.fingerprint = b""
+        # Just after the last complete record; a restart resumes here
+        self.record_offset = 0
+        self._parser = RecordParser()
+        self._partial = b""
+
+    def _restore(self, state):
+        self.offset = self.record_offset = state["offset"]
+        self.identity = tuple(state["identity"])
+        self.fingerprint = bytes.fromhex(state["fingerprint"])
+
+    def state(self):
+        """
+        JSON-serialisable position to pass back as state= after a restart.
+        None until the file has been read.
+        """
+        with self._lock:
+            if self.identity is None:
+                return None
+            return {
+                "offset": self.record_offset,
+                "identity": list(self.identity),
+                "fingerprint": self.fingerprint.hex(),
+            }
+
+    def _read_fingerprint(self, f):
+        f.seek(0)
+        return f.read(FINGERPRINT_SIZE)
+
+    def _replaced(self, stat, f):
+        """
+        True if the file was rotated, truncated or rewritten since the last read.
+        """
+        if self.identity is None:
+            return False
+        if (stat.st_dev, stat.st_ino) != self.identity or stat.st_size < self.offset:
+            return True
+        # Rewritten in place to at least the old length: compare the head we saw
+        head = self._read_fingerprint(f)
+        return head[:len(self.fingerprint)] != self.fingerprint
+
+    def refresh(self):
+        """
+        Parses bytes appended since the last call and returns the new records.
+        """
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                if self.identity is not None:
+                    logger.info(f"{self.path} is gone; starting over when it reappears.")
+                    self._reset()
+                return []
+
+            with f:
+                stat = os.fstat(f.fileno())
+                if self._replaced(stat, f):
+                    logger.info(f"{self.path} was truncated or rotated; re-reading from the start.")
+                    self._reset()
+
+                self.identity = (stat.st_dev, stat.st_ino)
+                if len(self.fingerprint) < FINGERPRINT_SIZE:
+                    self.fingerprint = self._read_fingerprint(f)
+
+                if stat.st_size == self.offset:
+                    return []
+                f.seek(self.offset)
+                chunk = f.read()
+
+            position = self.offset - len(self._partial)
+            self.offset += len(chunk)
+            data = self._partial + chunk
+            # Hold back an unterminated last line until its newline arrives
+            complete, newline, self._partial = data.rpartition(b"\n")
+
+            new_records = []
+            if newline:
+                for line in complete.split(b"\n"):
+                    position += len(line) + 1
+                    record = self._parser.feed(line.decode("utf-8", errors="replace"))
+                    if record:
+                        new_records.append(record)
+                        self.record_offset = position
+            return new_records
@@ -1,6 +1,7 @@
 # config.py
 import os
 from datetime import datetime, timedelta
+from user_store import load_users
 
 
 URL = "https://unityplace.aeroparker.com/book/Santander/Parking?parkingCmd=collectParkingDetails"
@@ -81,6 +82,104 @@ BOOKING_DETAILS = {
     "exit_time": "19:00",
 }
 
+# Parallel runner (python main.py --parallel --workers N)
+MAX_WORKERS = 4
+RESULTS_FILE = "/Users/admin/pip_install/booking_results.log"
+
+# Reuse warm, reset Chrome sessions between bookings instead of relaunching
+USE_DRIVER_POOL = True
+
+# One Chrome for every vehicle (main.py --tabs, multitab.py): each booking gets
+# its own tab in an isolated browser context. "none" returns from navigations
+# at once so the other tabs can run while one page loads; steps wait on the DOM.
+MULTI_TAB_PAGE_LOAD_STRATEGY = "none"
+# Seconds a new tab may take to load its start page
+MULTI_TAB_OPEN_TIMEOUT = 15
+
+# Chrome profile: "full" renders everything like a normal browser; "lean"
+# skips resources the automation never needs (see driver_utils.init_driver)
+DRIVER_PROFILE = "full"
+LEAN_HEADLESS = True
+LEAN_BLOCKED_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*.css",
+]
+LEAN_THIRD_PARTY_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "facebook.net", "facebook.com", "hotjar.com", "clarity.ms", "bing.com",
+    "fonts.googleapis.com", "fonts.gstatic.com", "cookielaw.org", "onetrust.com",
+]
+# Hosts whose scripts the booking form needs (the site and reCAPTCHA); never
+# blocked. Kept to exact hosts so fonts.gstatic.com above still gets blocked
+LEAN_ALLOWED_HOSTS = ["aeroparker.com", "www.google.com", "www.gstatic.com"]
+
+# Persistent Chrome profiles (profiles.py, main.py --persistent-profile): each
+# worker locks its own --user-data-dir under PROFILE_ROOT, so the HTTP disk
+# cache and the site's consent cookies carry over from one run to the next
+PERSISTENT_PROFILES = False
+PROFILE_ROOT = "/Users/admin/pip_install/chrome_profiles"
+# Chrome's own disk cache cap, and the size the periodic cleanup trims each profile's caches to (MB)
+PROFILE_CACHE_MAX_MB = 200
+# How often a profile's caches are measured against PROFILE_CACHE_MAX_MB (seconds)
+PROFILE_CLEANUP_INTERVAL = 24 * 3600
+# Cookies a pooled session with a persistent profile keeps when reset between vehicles
+PRESERVED_COOKIES = ["OptanonConsent", "OptanonAlertBoxClosed", "cookieconsent_status"]
+
+# Fill each form in one script call; False types every field with send_keys
+BATCH_FORM_FILL = True
+
+# Per-step booking timings, one JSON line per vehicle (tracing.py); app.py serves them on /metrics
+TRACE_FILE = "/Users/admin/pip_install/booking_spans.log"
+
+# Which fallback selector last worked for each step (selector_cache.py)
+SELECTOR_CACHE_FILE = "/Users/admin/pip_install/selector_cache.json"
+
+# How booking steps wait for the page: "fast" waits on DOM conditions,
+# "conservative" keeps the original fixed sleeps (see waits.py)
+WAIT_PROFILE = "fast"
+# Overall time allowed per booking, excluding time spent waiting for sold-out parking (seconds)
+BOOKING_LATENCY_BUDGET = 180
+
+# Multi-day mode (main.py --days): how many days ahead, from tomorrow, one run books
+BATCH_DAYS_AHEAD = 7
+
+# Resident daemon (main.py --daemon, daemon.py): command socket, and how long
+# before a scheduled release time it refreshes its drivers and pre-stages (seconds)
+DAEMON_SOCKET = "/tmp/booking-daemon.sock"
+DAEMON_PRESTAGE_LEAD = 60
+
+# "selenium" drives Chrome; "http" tries direct form posts first (http_engine.py)
+# and falls back to Selenium if they fail
+BOOKING_ENGINE = "selenium"
+HTTP_TIMEOUT = 15
+
+# Shared sold-out watcher (availability.py): probe interval grows from min to max while sold out (seconds)
+AVAILABILITY_MIN_INTERVAL = 0.5
+AVAILABILITY_MAX_INTERVAL = 5
+
+# Indexed booking ledger (ledger.py); booking_reference.txt is kept as a plain-text log
+LEDGER_FILE = "/Users/admin/pip_install/bookings.db"
+
+# How long a run's claim on a vehicle/date (ledger.py) blocks other runs if it
+# never finishes, e.g. a crash after 'Book and Pay' (seconds)
+BOOKING_CLAIM_TTL = 3600
+
+# Retries after a failed booking, per failure class (failures.py): how many,
+# the backoff before the first (doubling after each, up to max_delay) and the
+# total time allowed for that class's retries (seconds)
+RETRY_POLICIES = {
+    "transient": {"retries": 3, "base_delay": 2, "max_delay": 20, "budget": 180},
+    "capacity": {"retries": 2, "base_delay": 30, "max_delay": 300, "budget": 3600},
+    "permanent": {"retries": 0, "base_delay": 0, "max_delay": 0, "budget": 0},
+}
+
+# Users live in the user store (user_store.py); the USER_DETAILS_LIST literal
+# above only seeds it on first run. Edit users through the dashboard.
+USERS_FILE = "/Users/admin/pip_install/users.json"
+USER_DETAILS_LIST = load_users(USERS_FILE, seed=USER_DETAILS_LIST)
+
 
 
 # If you need to install modules dynamically (not generally recommended in production):
@@ -133,12 +232,24 @@ tomorrow_date = (current_datetime + timedelta(days=1)).date()
 # }
 
 # Parking details for the actual form fields (dd/mm/yyyy)
-PARKING_DETAILS = {
-    "entry_date": tomorrow_date.strftime("%d/%m/%Y"),
-    "entry_time": "06:00",  # Fixed entry time
-    "exit_date": tomorrow_date.strftime("%d/%m/%Y"),
-    "exit_time": "19:00",   # Default exit time
-}
+def parking_details_for(day):
+    return {
+        "entry_date": day.strftime("%d/%m/%Y"),
+        "entry_time": "06:00",  # Fixed entry time
+        "exit_date": day.strftime("%d/%m/%Y"),
+        "exit_time": "19:00",   # Default exit time
+    }
+
+# Same day in BOOKING_DETAILS' format (YYYY-MM-DD)
+def booking_details_for(day):
+    return {
+        "entry_date": day.strftime("%Y-%m-%d"),
+        "entry_time": "06:00",
+        "exit_date": day.strftime("%Y-%m-%d"),
+        "exit_time": "19:00",
+    }
+
+PARKING_DETAILS = parking_details_for(tomorrow_date)
 
 
 # If you want a dynamic approach using current system time, you can do:
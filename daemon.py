@@ -0,0 +1,301 @@
+# daemon.py
+"""
+Resident booking daemon and its command-line client.
+
+A cron-triggered main.py run spends its first seconds starting Python,
+importing Selenium and launching Chrome, all at release time. The daemon
+does that once: it keeps the interpreter and a warm DriverPool alive and
+takes commands over a local Unix socket. Users and booking dates are worked
+out afresh for every run.
+
+    python main.py --daemon                 # start the daemon
+    python daemon.py run                    # book now, streaming progress
+    python daemon.py run --at 06:00:00      # pre-stage shortly before 06:00, release at 06:00
+    python daemon.py status
+    python daemon.py stop
+
+The client sends one JSON object per line ({"cmd": "run" | "status" | "stop", ...})
+and the daemon answers with JSON lines ({"type": "log" | "result" | "status" |
+"error" | "done", ...}) until the command is finished.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+from datetime import datetime, timedelta
+from config import (
+    URL, USERS_FILE, MAX_WORKERS, BOOKING_ENGINE, DRIVER_PROFILE, DAEMON_SOCKET, DAEMON_PRESTAGE_LEAD,
+    PERSISTENT_PROFILES,
+)
+from driver_utils import DriverPool, init_driver
+from scheduler import parse_release_time, seconds_until
+from user_store import load_users
+from main import configure_logging, plan_jobs, main as run_bookings
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s.%(msecs)03d [%(levelname)s] [%(threadName)s] %(name)s - %(message)s"
+
+class ClientLogHandler(logging.Handler):
+    """
+    Forwards log records to a connected client while it waits on a command.
+    """
+
+    def __init__(self, send):
+        super().__init__(logging.INFO)
+        self.send = send
+        self.disconnected = False
+        self.setFormatter(logging.Formatter(LOG_FORMAT, datefmt="%H:%M:%S"))
+
+    def emit(self, record):
+        if self.disconnected:
+            return
+        try:
+            self.send({"type": "log", "message": self.format(record)})
+        except OSError:
+            # Client went away; the run carries on without it
+            self.disconnected = True
+
+class BookingDaemon:
+    """
+    Runs bookings on demand with a pool of drivers kept warm between runs.
+    One run at a time; later commands queue behind it.
+    """
+
+    def __init__(self, socket_path=DAEMON_SOCKET, workers=MAX_WORKERS, profile=DRIVER_PROFILE,
+                 engine=BOOKING_ENGINE, prestage_lead=DAEMON_PRESTAGE_LEAD, persistent_profile=PERSISTENT_PROFILES):
+        self.socket_path = socket_path
+        self.profile = profile
+        self.engine = engine
+        self.prestage_lead = prestage_lead
+        self.pool = DriverPool(
+            workers, URL, factory=functools.partial(init_driver, profile, persistent_profile=persistent_profile)
+        )
+        self.started = datetime.now()
+        self.scheduled = []
+        self.running = False
+        self.last_run = None
+        self._run_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._server = None
+
+    def run(self, release_at=None, days=None, refresh=True, log_handler=None):
+        """
+        Books every eligible user now (or pre-staged for release_at) with the
+        warm pool. Users are re-read from the user store for every run.
+        refresh reloads the idle sessions first, which may have sat on the
+        start page for hours. log_handler receives this run's log records;
+        it is attached only once the run holds the run lock, so a queued
+        client never sees another client's run.
+        """
+        users = load_users(USERS_FILE)
+        with self._run_lock:
+            self.running = True
+            if log_handler:
+                logging.getLogger().addHandler(log_handler)
+            try:
+                if release_at:
+                    # One warm session per vehicle so nobody queues behind the gate
+                    self.pool.grow(len(plan_jobs(users, days)))
+                if refresh:
+                    self.pool.refresh()
+                results = run_bookings(
+                    parallel=True, workers=self.pool.size, engine=self.engine, release_at=release_at,
+                    profile=self.profile, days=days, users=users, pool=self.pool,
+                )
+            finally:
+                if log_handler:
+                    logging.getLogger().removeHandler(log_handler)
+                self.running = False
+        self.last_run = {
+            "finished": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "succeeded": sum(1 for r in results if r["success"]),
+            "total": len(results),
+        }
+        return results
+
+    def run_at(self, release_at, days=None, log_handler=None):
+        """
+        Sleeps until prestage_lead seconds before release_at, then runs with
+        the release gate. Returns None if the daemon stops first.
+        """
+        self.scheduled.append(release_at)
+        try:
+            start_at = release_at - timedelta(seconds=self.prestage_lead)
+            logger.info(f"Run scheduled for {release_at}; pre-staging from {start_at}.")
+            while seconds_until(start_at) > 0:
+                if self._stopping.wait(min(seconds_until(start_at), 60)):
+                    logger.info(f"Daemon stopping; cancelled run for {release_at}.")
+                    return None
+            return self.run(release_at, days, refresh=True, log_handler=log_handler)
+        finally:
+            self.scheduled.remove(release_at)
+
+    def status(self):
+        return {
+            "started": self.started.strftime('%Y-%m-%d %H:%M:%S'),
+            "running": self.running,
+            "scheduled": [t.strftime('%Y-%m-%d %H:%M:%S') for t in self.scheduled],
+            "pool_size": self.pool.size,
+            "last_run": self.last_run,
+        }
+
+    def handle(self, request, send):
+        """
+        Carries out one client command, reporting progress through send().
+        """
+        cmd = request.get("cmd")
+        if cmd == "status":
+            send({"type": "status", **self.status()})
+        elif cmd == "stop":
+            send({"type": "status", "message": "Daemon stopping."})
+            threading.Thread(target=self.stop, name="daemon-stop", daemon=True).start()
+        elif cmd == "run":
+            if request.get("at") and request.get("days"):
+                # Multi-date bookings never wait at the release gate (as in main.py)
+                raise ValueError("--days cannot be combined with --at")
+            release_at = parse_release_time(request["at"]) if request.get("at") else None
+            handler = ClientLogHandler(send)
+            if self._run_lock.locked():
+                send({"type": "log", "message": "Another run is in progress; queued behind it."})
+            if release_at:
+                send({"type": "log", "message": f"Run scheduled for {release_at}."})
+                results = self.run_at(release_at, request.get("days"), log_handler=handler)
+            else:
+                results = self.run(days=request.get("days"), log_handler=handler)
+            send({"type": "result", "results": results})
+        else:
+            send({"type": "error", "error": f"Unknown command {cmd!r}"})
+
+    def serve_forever(self):
+        configure_logging()
+        if os.path.exists(self.socket_path):
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.socket_path)
+                raise RuntimeError(f"A booking daemon is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)  # left over from a daemon that died
+
+        self.pool.start()
+        self._server = DaemonServer(self.socket_path, self)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Booking daemon listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.close()
+            logger.info("Booking daemon stopped.")
+
+    def stop(self):
+        self._stopping.set()
+        if self._server:
+            self._server.shutdown()
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def send(message):
+            line = (json.dumps(message, default=str) + "\n").encode("utf-8")
+            with write_lock:
+                self.wfile.write(line)
+                self.wfile.flush()
+
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+            self.server.booking_daemon.handle(request, send)
+        except (ValueError, KeyError) as e:
+            send({"type": "error", "error": str(e)})
+        except Exception as e:
+            logger.error(f"Daemon command failed: {e}", exc_info=True)
+            send({"type": "error", "error": str(e)})
+        finally:
+            try:
+                send({"type": "done"})
+            except OSError:
+                pass
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, booking_daemon):
+        self.booking_daemon = booking_daemon
+        super().__init__(socket_path, DaemonRequestHandler)
+
+def send_command(request, socket_path=DAEMON_SOCKET):
+    """
+    Sends one command to the daemon and yields its replies as they arrive.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                message = json.loads(line)
+                yield message
+                if message.get("type") == "done":
+                    return
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Control a running booking daemon (start one with main.py --daemon).")
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    commands = parser.add_subparsers(dest="cmd", required=True)
+    run = commands.add_parser("run", help="Book every vehicle with Book=Y, streaming progress.")
+    run.add_argument("--at", metavar="HH:MM[:SS]",
+                     help="Pre-stage shortly before this time and click 'Book Now' together at it.")
+    run.add_argument("--days", type=int, metavar="N", help="Book every toggled date in the next N days.")
+    commands.add_parser("status", help="Show whether a run is in progress or scheduled.")
+    commands.add_parser("stop", help="Stop the daemon and close its browsers.")
+    args = parser.parse_args(argv)
+    if args.cmd == "run" and args.at:
+        if args.days:
+            parser.error("--days cannot be combined with --at")
+        try:
+            parse_release_time(args.at)  # fail here rather than in the daemon
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+def client_main(argv=None):
+    args = parse_args(argv)
+    request = {"cmd": args.cmd}
+    if args.cmd == "run":
+        request.update(at=args.at, days=args.days)
+
+    ok = True
+    try:
+        for message in send_command(request, args.socket):
+            kind = message.get("type")
+            if kind == "log":
+                print(message["message"])
+            elif kind == "status":
+                print(json.dumps({k: v for k, v in message.items() if k != "type"}, indent=2))
+            elif kind == "result":
+                results = message.get("results")
+                if results is None:
+                    print("Run cancelled.")
+                    ok = False
+                    continue
+                for r in results:
+                    print(f"{r['vehicle_reg']}: {'booked' if r['success'] else 'FAILED'}"
+                          + (f" ({r['error']})" if r.get("error") else ""))
+                ok = all(r["success"] for r in results)
+            elif kind == "error":
+                print(f"Error: {message['error']}", file=sys.stderr)
+                ok = False
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No booking daemon is listening on {args.socket}", file=sys.stderr)
+        return 2
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(client_main())
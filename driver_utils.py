@@ -1,7 +1,12 @@
 # driver_utils.py
+import json
 import logging
+import queue
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import (
@@ -10,26 +15,87 @@ from selenium.common.exceptions import (
 )
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from waits import page_settle_delay
+from profiles import get_profile_manager
+from config import (
+    DRIVER_PROFILE, LEAN_HEADLESS, LEAN_BLOCKED_PATTERNS, LEAN_THIRD_PARTY_HOSTS, LEAN_ALLOWED_HOSTS,
+    PERSISTENT_PROFILES, PROFILE_CACHE_MAX_MB, PRESERVED_COOKIES,
+)
 
 logger = logging.getLogger(__name__)
 
-def init_driver():
+DRIVER_PROFILES = ("full", "lean")
+
+# Rough transfer size of a request by resource type, used to estimate what
+# the lean profile saved by blocking it (bytes)
+TYPICAL_RESOURCE_BYTES = {
+    "Image": 40000,
+    "Font": 50000,
+    "Stylesheet": 30000,
+    "Script": 60000,
+    "Media": 200000,
+}
+OTHER_RESOURCE_BYTES = 5000
+
+# Fields of a Network.getCookies cookie that Network.setCookies accepts
+COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority",
+                 "sourceScheme", "sourcePort")
+
+def lean_blocked_urls(patterns=LEAN_BLOCKED_PATTERNS, third_party_hosts=LEAN_THIRD_PARTY_HOSTS,
+                      allowed_hosts=LEAN_ALLOWED_HOSTS):
+    """
+    URL patterns for Network.setBlockedURLs: unneeded resource types plus
+    third-party hosts, minus any host the booking form's scripts need.
+    """
+    hosts = [
+        host for host in third_party_hosts
+        if not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts)
+    ]
+    # Also match the same files when requested with a query string (e.g. "?v=3")
+    patterns = list(patterns) + [f"{pattern}?*" for pattern in patterns]
+    return patterns + [f"*://{host}/*" for host in hosts] + [f"*://*.{host}/*" for host in hosts]
+
+def init_driver(profile=DRIVER_PROFILE, page_load_strategy=None, persistent_profile=PERSISTENT_PROFILES):
     """
     Initialize a Chrome WebDriver with "stealth" options.
+    profile "lean" runs headless (if LEAN_HEADLESS), blocks images, fonts,
+    media, stylesheets and third-party trackers, and logs network traffic
+    so network_stats() can report what was saved.
+    page_load_strategy overrides Chrome's default ("normal").
+    persistent_profile runs Chrome on a locked profile directory of its own
+    (profiles.py), kept between runs, instead of a temporary one; the lock
+    is released when the driver quits.
     """
+    if profile not in DRIVER_PROFILES:
+        raise ValueError(f"Unknown driver profile '{profile}', expected one of {DRIVER_PROFILES}")
+    lean = profile == "lean"
+    managed_profile = get_profile_manager().acquire() if persistent_profile else None
+    driver = None
     try:
         options = webdriver.ChromeOptions()
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.add_experimental_option("excludeSwitches", ["enable-automation"])
         options.add_experimental_option('useAutomationExtension', False)
-        
+
+        if lean:
+            if LEAN_HEADLESS:
+                options.add_argument('--headless=new')
+            options.add_argument('--window-size=1920,1080')
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        else:
+            options.add_argument('--start-maximized')
+
         # Add regular browser features
-        options.add_argument('--start-maximized')
         options.add_argument('--ignore-certificate-errors')
         options.add_argument('--disable-gpu')
         options.add_argument('--no-sandbox')
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--enable-javascript')
+        if page_load_strategy:
+            options.page_load_strategy = page_load_strategy
+        if managed_profile:
+            options.add_argument(f'--user-data-dir={managed_profile.path}')
+            options.add_argument(f'--disk-cache-size={PROFILE_CACHE_MAX_MB * 1024 * 1024}')
 
         # Use a custom user agent
         options.add_argument(
@@ -38,22 +104,130 @@ def init_driver():
              Safari/537.36'
         )
 
-        logger.info("Initializing Chrome WebDriver with stealth options...")
+        logger.info(f"Initializing Chrome WebDriver with stealth options ({profile} profile)...")
         driver = webdriver.Chrome(options=options)
 
-        # Execute CDP command to prevent detection
-        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
-            'source': '''
-                Object.defineProperty(navigator, 'webdriver', {
-                    get: () => undefined
-                })
-            '''
-        })
+        driver.profile = profile
+        driver.managed_profile = managed_profile
+        if managed_profile:
+            quit_browser = driver.quit
+
+            def quit():
+                # Chrome has let go of the profile once quit() returns
+                try:
+                    quit_browser()
+                finally:
+                    managed_profile.release()
+            driver.quit = quit
+        prepare_target(driver)
         return driver
     except WebDriverException as e:
+        # Chrome must be gone before its profile lock is let go
+        if driver:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+        if managed_profile:
+            managed_profile.release()
         logger.error(f"Error: Unable to initialize WebDriver. Details: {str(e)}")
         raise e
 
+def prepare_target(driver):
+    """
+    Per-tab CDP setup: the lean profile's request blocking and the
+    navigator.webdriver patch. Tabs opened later (multitab.py) need it too.
+    """
+    if getattr(driver, "profile", None) == "lean":
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': lean_blocked_urls()})
+
+    # Execute CDP command to prevent detection
+    driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
+        'source': '''
+            Object.defineProperty(navigator, 'webdriver', {
+                get: () => undefined
+            })
+        '''
+    })
+
+def network_stats(driver):
+    """
+    Summarises network traffic since the last call from Chrome's performance
+    log (lean profile only): requests made, bytes transferred, requests
+    blocked, and an estimate of the bytes the blocking saved.
+    """
+    try:
+        entries = driver.get_log('performance')
+    except Exception as e:
+        logger.warning(f"Performance log not available: {str(e)}")
+        return None
+
+    types = {}
+    stats = {"requests": 0, "bytes": 0, "blocked_requests": 0, "estimated_bytes_saved": 0}
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        method, params = message.get("method"), message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            stats["requests"] += 1
+            types[params.get("requestId")] = params.get("type")
+        elif method == "Network.loadingFinished":
+            stats["bytes"] += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed" and params.get("blockedReason"):
+            stats["blocked_requests"] += 1
+            resource_type = params.get("type") or types.get(params.get("requestId"))
+            stats["estimated_bytes_saved"] += TYPICAL_RESOURCE_BYTES.get(resource_type, OTHER_RESOURCE_BYTES)
+    return stats
+
+def discard_network_log(driver):
+    """
+    Drops the performance log gathered so far (lean profile), so the next
+    network_stats() only counts later traffic: a pooled session's reload of
+    the start page belongs to no booking.
+    """
+    if getattr(driver, "profile", None) != "lean":
+        return
+    try:
+        driver.get_log('performance')
+    except Exception as e:
+        logger.warning(f"Could not discard performance log: {str(e)}")
+
+# Sets each field through the native value setter (so framework-bound inputs
+# notice), fires input/change/blur, then reads every value back in the same call.
+FILL_FIELDS_SCRIPT = """
+const values = arguments[0];
+const result = {};
+for (const [id, value] of Object.entries(values)) {
+    const el = document.getElementById(id);
+    if (!el) continue;
+    const proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype
+        : el instanceof HTMLSelectElement ? HTMLSelectElement.prototype
+        : HTMLInputElement.prototype;
+    Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+    el.dispatchEvent(new FocusEvent('blur'));
+    el.dispatchEvent(new FocusEvent('focusout', {bubbles: true}));
+}
+for (const id of Object.keys(values)) {
+    const el = document.getElementById(id);
+    result[id] = el ? el.value : null;
+}
+return result;
+"""
+
+def fill_fields(driver, values):
+    """
+    Fills several fields ({element id: value}) in a single execute_script call.
+    Returns {element id: value read back}, with None for fields not on the
+    page, or None if the script itself failed.
+    """
+    try:
+        return driver.execute_script(FILL_FIELDS_SCRIPT, values)
+    except Exception as e:
+        logger.error(f"Batched form fill failed: {str(e)}")
+        return None
+
 def check_website_accessibility(url):
     """
     Simple check to see if the URL is returning a 200 status code.
@@ -67,18 +241,26 @@ def check_website_accessibility(url):
         logger.error(f"Error checking website: {str(e)}")
         return False
 
-def wait_for_page_load(driver, timeout=5):
+def wait_for_page_load(driver, timeout=5, settle=None):
     """
     Waits until the document.readyState == 'complete'.
+    settle is an extra fixed wait afterwards; by default it follows the wait
+    profile (2s for "conservative", none for "fast").
     """
+    if settle is None:
+        settle = page_settle_delay()
+    started = time.perf_counter()
     try:
         logger.info("Waiting for page to load completely...")
         WebDriverWait(driver, timeout).until(
             lambda d: d.execute_script('return document.readyState') == 'complete'
         )
         # Additional small wait to let JS finalize
-        time.sleep(2)
-        logger.info("Page load complete.")
+        if settle:
+            time.sleep(settle)
+        managed_profile = getattr(driver, "managed_profile", None)
+        cache = f", {'warm' if managed_profile.warm else 'new'} profile" if managed_profile else ""
+        logger.info(f"Page load complete in {(time.perf_counter() - started) * 1000:.0f}ms{cache}.")
         return True
     except Exception as e:
         logger.error(f"Error waiting for page load: {str(e)}")
@@ -105,3 +287,207 @@ def wait_for_element(driver, locator_type, locator_value, timeout=10, clickable=
     except Exception as e:
         logger.error(f"Error finding element {locator_type}={locator_value}: {str(e)}")
         return None
+
+def is_driver_alive(driver):
+    """
+    Health check: returns True if the browser session still answers commands.
+    """
+    try:
+        return driver.execute_script("return 1") == 1
+    except Exception:
+        return False
+
+def cookie_params(cookie):
+    """
+    A cookie from Network.getCookies as Network.setCookies takes it.
+    """
+    params = {key: cookie[key] for key in COOKIE_PARAMS if key in cookie}
+    if cookie.get("session"):
+        params.pop("expires", None)
+    return params
+
+def reset_driver(driver, url):
+    """
+    Returns a used driver to a clean state without relaunching Chrome:
+    closes extra tabs, clears cookies and storage, then navigates back to url.
+    A driver on a persistent profile keeps its PRESERVED_COOKIES (consent).
+    Also used for a persistent profile's first page load, which would
+    otherwise start with the previous run's booking cookies.
+    """
+    handles = driver.window_handles
+    for handle in handles[1:]:
+        driver.switch_to.window(handle)
+        driver.close()
+    driver.switch_to.window(handles[0])
+
+    kept = []
+    if getattr(driver, "managed_profile", None):
+        # Every cookie in the browser, not just the current page's (about:blank has none)
+        cookies = driver.execute_cdp_cmd('Network.getAllCookies', {}).get('cookies', [])
+        kept = [cookie_params(cookie) for cookie in cookies if cookie["name"] in PRESERVED_COOKIES]
+
+    driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+    try:
+        driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    except Exception:
+        pass  # e.g. about:blank has no storage
+    parts = urlsplit(url)
+    driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+        'origin': f"{parts.scheme}://{parts.netloc}",
+        'storageTypes': 'cookies,local_storage,session_storage,indexeddb,cache_storage,service_workers',
+    })
+    if kept:
+        driver.execute_cdp_cmd('Network.setCookies', {'cookies': kept})
+    driver.get(url)
+
+class DriverPool:
+    """
+    Keeps N stealth-patched Chrome sessions warm and hands them out one at a time.
+    Sessions are reset between bookings instead of relaunched, and crashed
+    sessions are replaced with fresh ones.
+    """
+
+    def __init__(self, size, url, factory=init_driver):
+        self.size = size
+        self.url = url
+        self.factory = factory
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._drivers = []
+
+    def _launch(self):
+        driver = self.factory()
+        if getattr(driver, "managed_profile", None):
+            # Only PRESERVED_COOKIES survive from the profile's previous run
+            reset_driver(driver, self.url)
+        else:
+            driver.get(self.url)
+        discard_network_log(driver)
+        with self._lock:
+            self._drivers.append(driver)
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _replace(self, driver):
+        logger.warning("Replacing unhealthy WebDriver session...")
+        if driver is not None:
+            self._discard(driver)
+        return self._launch()
+
+    def _warm(self, count):
+        def _launch(_):
+            try:
+                return self._launch()
+            except Exception as e:
+                # Leave an empty slot; acquire() will retry the launch
+                logger.error(f"Failed to warm WebDriver session: {str(e)}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            for driver in executor.map(_launch, range(count)):
+                self._idle.put(driver)
+
+    def start(self):
+        """
+        Launches every session up front, in parallel, and loads the start URL.
+        """
+        logger.info(f"Warming WebDriver pool with {self.size} sessions...")
+        self._warm(self.size)
+        logger.info("WebDriver pool ready.")
+        return self
+
+    def grow(self, size):
+        """
+        Adds warm sessions until the pool holds size.
+        """
+        with self._lock:
+            extra = size - self.size
+            if extra <= 0:
+                return
+            self.size = size
+        logger.info(f"Growing WebDriver pool by {extra} sessions...")
+        self._warm(extra)
+
+    def refresh(self):
+        """
+        Resets every idle session and reloads the start URL, e.g. before a
+        scheduled run after the pool has sat idle for a long time.
+        """
+        drivers = []
+        while True:
+            try:
+                drivers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        if not drivers:
+            return
+        logger.info(f"Refreshing {len(drivers)} idle WebDriver sessions...")
+
+        def _refresh(driver):
+            if driver is None:
+                self._idle.put(None)
+            else:
+                self.release(driver)
+
+        with ThreadPoolExecutor(max_workers=len(drivers)) as executor:
+            list(executor.map(_refresh, drivers))
+
+    def replace(self, driver):
+        """
+        Swaps a checked-out session that has crashed for a fresh one on the start URL.
+        """
+        return self._replace(driver)
+
+    def acquire(self, timeout=None):
+        """
+        Takes an idle session, replacing it first if it fails the health check.
+        """
+        driver = self._idle.get(timeout=timeout)
+        if driver is None or not is_driver_alive(driver):
+            try:
+                driver = self._replace(driver)
+            except Exception:
+                # Keep the slot so a later acquire can retry the launch
+                self._idle.put(None)
+                raise
+        return driver
+
+    def release(self, driver):
+        """
+        Resets a session and returns it to the pool. A session that crashed or
+        cannot be reset is discarded and relaunched on its next acquire.
+        """
+        try:
+            if not is_driver_alive(driver):
+                raise WebDriverException("session is not responding")
+            reset_driver(driver, self.url)
+            discard_network_log(driver)
+        except Exception as e:
+            logger.warning(f"Could not reset WebDriver session: {str(e)}")
+            self._discard(driver)
+            driver = None
+        self._idle.put(driver)
+
+    def close(self):
+        """
+        Quits every session owned by the pool.
+        """
+        with self._lock:
+            drivers = list(self._drivers)
+        for driver in drivers:
+            self._discard(driver)
+        logger.info("WebDriver pool closed.")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,75 @@
+# events.py
+"""
+Small in-process event bus for the dashboard's server-sent events feed.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is considered too slow and dropped
+SUBSCRIBER_QUEUE_SIZE = 256
+
+class EventBus:
+    """
+    Fan-out of (event, data) pairs to every subscriber's queue.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def is_subscribed(self, q):
+        with self._lock:
+            return q in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                logger.warning("Dropping slow event subscriber.")
+                self.unsubscribe(q)
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_stream(bus, heartbeat_interval):
+    """
+    Generator for one SSE client: published events as they arrive, and a
+    heartbeat event whenever nothing was sent for heartbeat_interval seconds.
+    """
+    q = bus.subscribe()
+    try:
+        yield format_sse("heartbeat", {"time": time.time()})
+        while True:
+            try:
+                event, data = q.get(timeout=heartbeat_interval)
+            except queue.Empty:
+                if not bus.is_subscribed(q):
+                    # Dropped for falling behind; ending the stream makes the browser reconnect
+                    return
+                yield format_sse("heartbeat", {"time": time.time()})
+                continue
+            yield format_sse(event, data)
+    finally:
+        bus.unsubscribe(q)
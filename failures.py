@@ -0,0 +1,102 @@
+# failures.py
+"""
+Why a booking failed, and whether and when to try again.
+
+    transient  the page or browser misbehaved: an element did not appear in
+               time, a WebDriver command failed. Retried soon, in place.
+    capacity   Standard Parking stayed sold out. Retried on a slower schedule.
+    permanent  retrying cannot help: pre-booking is not open for the date,
+               or the date has passed. Not retried.
+
+Each class has its own policy in config.RETRY_POLICIES.
+"""
+import random
+import time
+from selenium.common.exceptions import WebDriverException
+from config import RETRY_POLICIES
+
+TRANSIENT = "transient"
+CAPACITY = "capacity"
+PERMANENT = "permanent"
+
+# Random +/- fraction applied to every backoff so parallel bookings don't retry in step
+JITTER = 0.2
+
+class BookingFailure(Exception):
+    """
+    A booking step failed; kind says which retry policy applies.
+    """
+    kind = TRANSIENT
+
+class TransientFailure(BookingFailure):
+    kind = TRANSIENT
+
+class CapacityFailure(BookingFailure):
+    kind = CAPACITY
+
+class PermanentFailure(BookingFailure):
+    kind = PERMANENT
+
+def classify(error):
+    """
+    The failure class of an exception raised by a booking.
+    """
+    if isinstance(error, BookingFailure):
+        return error.kind
+    if isinstance(error, ValueError):
+        return PERMANENT  # e.g. validate_booking_time()
+    if isinstance(error, WebDriverException):
+        return TRANSIENT  # includes TimeoutException and LatencyBudgetExceeded
+    return TRANSIENT
+
+class RetryPolicy:
+    """
+    Up to retries retries, backing off from base_delay and doubling each
+    time up to max_delay, all within budget seconds of the first failure.
+    """
+
+    def __init__(self, retries, base_delay, max_delay, budget):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def delay(self, retry):
+        """
+        Backoff before the given retry (1 for the first).
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return max(0, delay * (1 + random.uniform(-JITTER, JITTER)))
+
+class RetryBudget:
+    """
+    Counts one booking's failures per class against its policy.
+    """
+
+    def __init__(self, policies=None):
+        self.policies = policies or {kind: RetryPolicy(**policy) for kind, policy in RETRY_POLICIES.items()}
+        self.failures = {}
+        self._first_failure = {}
+
+    def next_delay(self, kind):
+        """
+        Records a failure of class kind and returns how long to back off
+        before retrying, or None if the class has run out of retries or time.
+        """
+        policy = self.policies[kind]
+        count = self.failures[kind] = self.failures.get(kind, 0) + 1
+        first = self._first_failure.setdefault(kind, time.monotonic())
+        if count > policy.retries:
+            return None
+        delay = policy.delay(count)
+        if time.monotonic() - first + delay > policy.budget:
+            return None
+        return delay
+
+    def remaining(self, kind):
+        """
+        Seconds left of kind's budget, or None before its first failure.
+        """
+        if kind not in self._first_failure:
+            return None
+        return max(0, self.policies[kind].budget - (time.monotonic() - self._first_failure[kind]))
@@ -0,0 +1,310 @@
+# http_engine.py
+"""
+Direct HTTP booking engine: replays the booking form posts with requests
+instead of driving a browser. Used as a fast path; main.py falls back to
+the Selenium flow in booking.py when it fails.
+"""
+import logging
+import queue
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from config import URL, PARKING_DETAILS, HTTP_TIMEOUT, MAX_WORKERS
+from booking import (
+    parse_booking_reference, save_booking_reference, should_book_today, validate_booking_time,
+    claim_booking, release_booking_claim,
+)
+from ledger import BOOKED, CLAIMED
+from tracing import span, tracing
+
+logger = logging.getLogger(__name__)
+
+STANDARD_PARKING_PID = "413"
+TAP_PERMIT_PID = "418"
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+# Form field ids on each step -> where their value comes from
+DATE_FIELDS = {
+    "changeEntryDate": "entry_date",
+    "changeEntryTime": "entry_time",
+    "changeExitDate": "exit_date",
+    "changeExitTime": "exit_time",
+}
+USER_FIELDS = {
+    "firstName": "first_name",
+    "lastName": "last_name",
+    "email": "email",
+    "registration": "vehicle_reg",
+}
+
+class HttpBookingError(Exception):
+    """
+    The HTTP path could not complete the booking; the caller should fall back to Selenium.
+    """
+
+class SoldOutError(HttpBookingError):
+    pass
+
+class PageParser(HTMLParser):
+    """
+    Collects the parts of a booking page the engine needs: forms and their
+    fields, product links, sold-out markers, alerts and the booking reference.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self.products = {}
+        self.sold_out = False
+        self.alerts = []
+        self.reference = None
+        self._text_target = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+
+        if tag == "form":
+            self.forms.append({
+                "id": attrs.get("id"),
+                "action": attrs.get("action") or "",
+                "method": (attrs.get("method") or "get").lower(),
+                "fields": [],
+            })
+        elif tag in ("input", "select", "textarea") and self.forms:
+            self.forms[-1]["fields"].append({
+                "tag": tag,
+                "id": attrs.get("id"),
+                "name": attrs.get("name"),
+                "type": (attrs.get("type") or "text").lower(),
+                "value": attrs.get("value") or "",
+                "checked": "checked" in attrs,
+            })
+        elif tag == "a" and attrs.get("data-step2-item"):
+            self.products[attrs["data-step2-item"]] = attrs.get("href")
+        elif tag == "div" and "item__soldout" in classes:
+            self.sold_out = True
+
+        if tag in ("h2", "div", "p"):
+            self._text_target = tag
+            self._text = []
+
+    def handle_data(self, data):
+        if self._text_target:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag != self._text_target:
+            return
+        text = "".join(self._text).strip()
+        self._text_target = None
+        if "Booking Reference:" in text and not self.reference:
+            self.reference = parse_booking_reference(text)
+        elif "coming soon" in text or "Sold Out" in text:
+            self.alerts.append(text)
+
+    def form_with(self, field_id):
+        """
+        Returns the first form containing a field with the given id.
+        """
+        for form in self.forms:
+            if any(field["id"] == field_id for field in form["fields"]):
+                return form
+        return None
+
+def parse_page(page_html):
+    parser = PageParser()
+    parser.feed(page_html)
+    parser.close()
+    return parser
+
+def form_payload(form, values):
+    """
+    Builds a form post: every named field's default (hidden fields such as
+    CSRF tokens included), overridden by values keyed on field id.
+    Checkboxes are only sent when checked or given a truthy value.
+    """
+    payload = {}
+    for field in form["fields"]:
+        name = field["name"]
+        if not name or field["type"] in ("submit", "button"):
+            continue
+        if field["type"] in ("checkbox", "radio"):
+            if values.get(field["id"]) or field["checked"]:
+                payload[name] = field["value"] or "on"
+            continue
+        payload[name] = values.get(field["id"], field["value"])
+    return payload
+
+class HttpSessionPool:
+    """
+    A fixed set of requests.Session objects sharing one keep-alive connection
+    pool. Each booking gets its own session (and cookie jar); cookies are
+    cleared when the session is returned.
+    """
+
+    def __init__(self, size=MAX_WORKERS):
+        self.adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+        self._idle = queue.Queue()
+        for _ in range(size):
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            session.headers.update({"User-Agent": USER_AGENT})
+            self._idle.put(session)
+
+    def acquire(self, timeout=None):
+        return self._idle.get(timeout=timeout)
+
+    def release(self, session):
+        session.cookies.clear()
+        self._idle.put(session)
+
+    def close(self):
+        self.adapter.close()
+
+class HttpBookingEngine:
+    """
+    Books parking with plain form posts:
+    collectParkingDetails -> product 413 (or 418 for TAP) -> user details + terms -> confirmation.
+    """
+
+    def __init__(self, url=URL, pool=None, timeout=HTTP_TIMEOUT, allow_tap=False, verify=False):
+        self.url = url
+        self.pool = pool or HttpSessionPool()
+        self.timeout = timeout
+        self.allow_tap = allow_tap
+        self.verify = verify
+
+    def _request(self, session, method, url, **kwargs):
+        try:
+            response = session.request(method, url, timeout=self.timeout, verify=self.verify, **kwargs)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise HttpBookingError(f"{method} {url} failed: {str(e)}") from e
+        return response
+
+    def _submit(self, session, base_url, form, values):
+        action = urljoin(base_url, form["action"]) if form["action"] else base_url
+        payload = form_payload(form, values)
+        if form["method"] == "post":
+            return self._request(session, "POST", action, data=payload)
+        return self._request(session, "GET", action, params=payload)
+
+    def collect_parking_details(self, session, parking_details):
+        response = self._request(session, "GET", self.url)
+        page = parse_page(response.text)
+        for alert in page.alerts:
+            if "Pre-booking parking at Unity Place is coming soon" in alert:
+                raise HttpBookingError(alert)
+
+        form = page.form_with("changeEntryDate")
+        if not form:
+            raise HttpBookingError("Parking details form not found.")
+        values = {field_id: parking_details[key] for field_id, key in DATE_FIELDS.items()}
+        logger.info(f"Posting parking dates {parking_details['entry_date']} - {parking_details['exit_date']}")
+        return self._submit(session, response.url, form, values)
+
+    def choose_product(self, session, response):
+        page = parse_page(response.text)
+        pid = STANDARD_PARKING_PID
+        if STANDARD_PARKING_PID not in page.products:
+            if not page.sold_out and not page.products:
+                raise HttpBookingError("Product list not found.")
+            if not self.allow_tap or TAP_PERMIT_PID not in page.products:
+                raise SoldOutError("Standard Parking is sold out.")
+            pid = TAP_PERMIT_PID
+        logger.info(f"Choosing product pid={pid}")
+        return self._request(session, "GET", urljoin(response.url, page.products[pid]))
+
+    def submit_user_details(self, session, response, user_details):
+        page = parse_page(response.text)
+        form = page.form_with("firstName")
+        if not form or not page.form_with("terms"):
+            raise HttpBookingError("User details form not found.")
+        values = {field_id: user_details[key] for field_id, key in USER_FIELDS.items()}
+        values["terms"] = True
+        logger.info(f"Submitting details and accepting terms for {user_details['vehicle_reg']}")
+        return self._submit(session, response.url, form, values)
+
+    def standard_parking_available(self, parking_details=PARKING_DETAILS):
+        """
+        Probes the product list: True if Standard Parking can be chosen, False if sold out.
+        """
+        session = self.pool.acquire()
+        try:
+            page = parse_page(self.collect_parking_details(session, parking_details).text)
+        finally:
+            self.pool.release(session)
+        if STANDARD_PARKING_PID in page.products:
+            return True
+        if page.sold_out:
+            return False
+        raise HttpBookingError("Product list not found.")
+
+    def book(self, user_details, parking_details=PARKING_DETAILS, progress=None):
+        """
+        Runs the whole flow for one vehicle and returns the booking reference.
+        Raises HttpBookingError if any step does not go as expected.
+        progress["submitted"] is set once the details and terms have been posted.
+        """
+        progress = {} if progress is None else progress
+        session = self.pool.acquire()
+        try:
+            with span("collect_parking_details"):
+                response = self.collect_parking_details(session, parking_details)
+            with span("choose_product"):
+                response = self.choose_product(session, response)
+            with span("submit_user_details"):
+                progress["submitted"] = True
+                response = self.submit_user_details(session, response, user_details)
+            reference = parse_page(response.text).reference
+            if not reference:
+                raise HttpBookingError("Booking reference not found on confirmation page.")
+            return reference
+        finally:
+            self.pool.release(session)
+
+def http_process_booking(engine, user_details, parking_details=PARKING_DETAILS):
+    """
+    HTTP counterpart of booking.process_booking: applies the same toggles and
+    date validation, claims the vehicle/date, books, and records the reference.
+    Returns True/False for skip decisions and for a failure after the details
+    were submitted (which must not be retried through Selenium); raises
+    HttpBookingError on any other failure.
+    """
+    if not should_book_today(user_details):
+        return False
+    try:
+        validate_booking_time(parking_details)
+    except ValueError as e:
+        logger.error(f"Error during booking process: {e}")
+        return False
+
+    status, key, owner = claim_booking(user_details, parking_details)
+    if status != CLAIMED:
+        return status == BOOKED
+
+    progress = {}
+    with tracing(user_details['vehicle_reg'], engine="http", booking_date=parking_details['entry_date']) as trace:
+        booking_ref = None
+        try:
+            booking_ref = engine.book(user_details, parking_details, progress)
+        except HttpBookingError as e:
+            if not progress.get("submitted"):
+                release_booking_claim(key, owner)
+                raise
+            # The booking may exist; keep the claim rather than risk a second one
+            logger.error(f"{key}: details submitted but not confirmed over HTTP ({e}); check before rebooking.")
+            return False
+        finally:
+            trace.finish(booking_ref is not None)
+    logger.info(f"Booking confirmed over HTTP! Reference: {booking_ref}")
+    save_booking_reference(user_details, booking_ref, parking_details)
+    return True
@@ -0,0 +1,288 @@
+# ledger.py
+"""
+Indexed booking ledger (SQLite, WAL mode).
+
+Replaces re-parsing booking_reference.txt on every request: bookings are
+stored once, indexed by booking date, email and vehicle. Records found in
+the text file (see booking_file.py) are merged in by reference, and the
+meta table remembers how far into the file that import has got.
+
+Bookings made by main.py also carry an idempotency key (vehicle + parking
+date). A run claims the key before it starts booking, so concurrent or
+repeated runs never book the same vehicle for the same day twice.
+"""
+import base64
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booked_at TEXT NOT NULL,
+    booking_date TEXT NOT NULL,
+    name TEXT,
+    email TEXT,
+    vehicle_reg TEXT,
+    reference TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL DEFAULT 'booking'
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings (booking_date, booked_at);
+CREATE INDEX IF NOT EXISTS idx_bookings_email ON bookings (email, booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_vehicle ON bookings (vehicle_reg, booking_date);
+CREATE INDEX IF NOT EXISTS idx_bookings_order ON bookings (booked_at, id);
+CREATE TABLE IF NOT EXISTS booking_claims (
+    idempotency_key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Added after the first release; existing ledgers get them on open
+MIGRATIONS = {
+    "parking_date": "ALTER TABLE bookings ADD COLUMN parking_date TEXT",
+    "idempotency_key": "ALTER TABLE bookings ADD COLUMN idempotency_key TEXT",
+}
+MIGRATION_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_idempotency ON bookings (idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+"""
+
+# claim() results
+CLAIMED = "claimed"   # this caller may book
+BOOKED = "booked"     # already booked; nothing to do
+BUSY = "busy"         # another live run is booking it
+
+def idempotency_key(vehicle_reg, parking_date):
+    """
+    Stable key for one vehicle on one parking date (YYYY-MM-DD).
+    """
+    return f"{vehicle_reg.replace(' ', '').upper()}|{parking_date}"
+
+COLUMNS = "id, booked_at, name, email, vehicle_reg, reference"
+
+def _row_to_booking(row):
+    _, booked_at, name, email, vehicle_reg, reference = row
+    return {
+        "date": booked_at,
+        "name": name,
+        "email": email,
+        "vehicle_reg": vehicle_reg,
+        "reference": reference,
+    }
+
+def encode_cursor(row):
+    """
+    Opaque pagination cursor pointing just after row.
+    """
+    booking_id, booked_at = row[0], row[1]
+    return base64.urlsafe_b64encode(json.dumps([booked_at, booking_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        booked_at, booking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(booked_at), int(booking_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+class BookingLedger:
+    """
+    Thread-safe access to the ledger; each thread gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+
+    def _migrate(self, conn):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(bookings)")}
+        with conn:
+            for column, sql in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(sql)
+        conn.executescript(MIGRATION_INDEXES)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, reference, name, email=None, vehicle_reg=None, booked_at=None, source="booking",
+               parking_date=None, idempotency_key=None):
+        """
+        Adds a booking and clears its claim. Returns False if the reference
+        (or idempotency key) was already recorded.
+        """
+        booked_at = booked_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO bookings (booked_at, booking_date, name, email, vehicle_reg, reference, source, "
+                "parking_date, idempotency_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (booked_at, booked_at[:10], name, email, vehicle_reg, reference, source,
+                 parking_date, idempotency_key),
+            )
+            if idempotency_key:
+                conn.execute("DELETE FROM booking_claims WHERE idempotency_key = ?", (idempotency_key,))
+        return cursor.rowcount == 1
+
+    def is_booked(self, key):
+        row = self._connect().execute(
+            "SELECT 1 FROM bookings WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def claim(self, key, owner, ttl):
+        """
+        Atomically claims key for owner. Returns BOOKED if it is already in
+        the ledger, BUSY if another owner claimed it less than ttl seconds
+        ago, otherwise CLAIMED (taking over any stale claim).
+        """
+        conn = self._connect()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # cannot both see the key as free
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM bookings WHERE idempotency_key = ?", (key,)).fetchone():
+                result = BOOKED
+            else:
+                row = conn.execute(
+                    "SELECT owner, claimed_at FROM booking_claims WHERE idempotency_key = ?", (key,)
+                ).fetchone()
+                if row and row[0] != owner and now - row[1] < ttl:
+                    result = BUSY
+                else:
+                    if row:
+                        logger.warning(f"Taking over claim on {key} from {row[0]}")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO booking_claims (idempotency_key, owner, claimed_at) VALUES (?, ?, ?)",
+                        (key, owner, now),
+                    )
+                    result = CLAIMED
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def renew_claim(self, key, owner):
+        """
+        Restarts the ttl on owner's claim on key. Returns False if owner no longer holds it.
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE booking_claims SET claimed_at = ? WHERE idempotency_key = ? AND owner = ?",
+                (time.time(), key, owner),
+            )
+        return cursor.rowcount == 1
+
+    def release_claim(self, key, owner):
+        """
+        Gives up owner's claim on key (after a failed attempt) so it can be retried.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM booking_claims WHERE idempotency_key = ? AND owner = ?", (key, owner))
+
+    def _rows(self, start_date=None, end_date=None, name=None, email=None, vehicle_reg=None,
+              after=None, limit=None):
+        clauses, params = [], []
+        if start_date:
+            clauses.append("booking_date >= ?")
+            params.append(start_date)
+        if end_date:
+            clauses.append("booking_date <= ?")
+            params.append(end_date)
+        if name:
+            clauses.append("name LIKE ?")
+            params.append(f"%{name}%")
+        for column, value in (("email", email), ("vehicle_reg", vehicle_reg)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if after:
+            # Keyset pagination: strictly after the cursor's (booked_at, id)
+            clauses.append("(booked_at, id) > (?, ?)")
+            params.extend(after)
+
+        sql = f"SELECT {COLUMNS} FROM bookings"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY booked_at, id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._connect().execute(sql, params)
+
+    def query(self, start_date=None, end_date=None, name=None, email=None, vehicle_reg=None, limit=None):
+        """
+        Bookings with start_date <= booking date <= end_date (YYYY-MM-DD, either
+        optional), optionally filtered by name (substring), email or vehicle, oldest first.
+        """
+        return list(self.iter_query(start_date, end_date, name, email, vehicle_reg, limit=limit))
+
+    def iter_query(self, start_date=None, end_date=None, name=None, email=None, vehicle_reg=None,
+                   after=None, limit=None):
+        """
+        Same as query() but yields bookings as SQLite produces them.
+        """
+        for row in self._rows(start_date, end_date, name, email, vehicle_reg, after, limit):
+            yield _row_to_booking(row)
+
+    def page(self, limit, cursor=None, **filters):
+        """
+        One page of query() results: (bookings, next_cursor). next_cursor is
+        None on the last page. Raises ValueError for a malformed cursor.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        rows = self._rows(after=after, limit=limit + 1, **filters).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return [_row_to_booking(row) for row in rows[:limit]], next_cursor
+
+    def on_date(self, date):
+        return self.query(start_date=date, end_date=date)
+
+    def get_meta(self, key):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def record_many(self, records, source="import"):
+        """
+        Adds parsed text-file records ({"date", "name", "reference"}), skipping
+        references already in the ledger. Returns the number added.
+        """
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO bookings (booked_at, booking_date, name, reference, source) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (r.get("date", ""), r.get("date", "")[:10], r.get("name"), r["reference"], source)
+                    for r in records
+                ],
+            )
+            return conn.total_changes - before
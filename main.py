@@ -1,7 +1,23 @@
+import argparse
+import functools
+import json
 import logging
-from config import URL, BOOKING_DETAILS, USER_DETAILS_LIST
-from driver_utils import init_driver, wait_for_page_load
-from booking import process_booking
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from config import (
+    URL, USER_DETAILS_LIST, MAX_WORKERS, RESULTS_FILE, USE_DRIVER_POOL, BOOKING_ENGINE,
+    DRIVER_PROFILE, BATCH_DAYS_AHEAD, PERSISTENT_PROFILES, booking_details_for, parking_details_for,
+)
+from driver_utils import DRIVER_PROFILES, DriverPool, init_driver, network_stats, reset_driver, wait_for_page_load
+from booking import booking_dates, get_ledger, process_booking, process_booking_dates, should_book_today
+from ledger import idempotency_key
+from http_engine import HttpBookingEngine, HttpBookingError, http_process_booking
+from multitab import TabDriverMixin, TabPool
+from scheduler import ReleaseGate, parse_release_time, seconds_until, summarise_offsets
+
+# Serialises writes to RESULTS_FILE so parallel workers never interleave lines
+_results_lock = threading.Lock()
 
 def configure_logging():
     """
@@ -9,42 +25,298 @@ def configure_logging():
     """
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+        format="%(asctime)s.%(msecs)03d [%(levelname)s] [%(threadName)s] %(name)s - %(message)s",
         datefmt="%H:%M:%S"
     )
     return logging.getLogger(__name__)
 
-def main():
-    logger = configure_logging()
+def record_result(result):
+    """
+    Appends one vehicle's result as a single JSON line to RESULTS_FILE.
+    """
+    line = json.dumps(result) + "\n"
+    with _results_lock:
+        with open(RESULTS_FILE, "a") as f:
+            f.write(line)
 
-    for user_details in USER_DETAILS_LIST:
-        # Only proceed if Book is Y
-        if user_details.get("Book") == "Y":
-            logger.info(f"Starting booking for vehicle: {user_details['vehicle_reg']}")
-            driver = None
+def open_start_page(driver):
+    """
+    Loads URL in a freshly launched driver. A persistent profile is reset
+    first, so only its PRESERVED_COOKIES survive from the previous run.
+    """
+    if driver.managed_profile:
+        reset_driver(driver, URL)
+    else:
+        driver.get(URL)
+
+def book_vehicle(user_details, pool=None, http_engine=None, gate=None, profile=DRIVER_PROFILE, dates=None,
+                 persistent_profile=PERSISTENT_PROFILES):
+    """
+    Runs the full booking flow for one vehicle.
+    If http_engine is given the direct HTTP path is tried first, falling back
+    to Selenium if it fails. Uses a warm session from pool if given, otherwise
+    launches its own driver with the given profile (on a persistent Chrome
+    profile if persistent_profile). With a gate, the Selenium
+    flow is pre-staged and held at "Book Now" until the release time.
+    dates (from plan_jobs) defaults to tomorrow; several dates are booked in
+    the same browser session (Selenium only), with a result per date.
+    Returns a result dict describing the outcome.
+    """
+    logger = logging.getLogger(__name__)
+    vehicle_reg = user_details['vehicle_reg']
+    result = {
+        "vehicle_reg": vehicle_reg,
+        "email": user_details.get("email"),
+        "started": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "success": False,
+        "error": None,
+        "engine": "selenium",
+    }
+    logger.info(f"Starting booking for vehicle: {vehicle_reg}")
+    driver = None
 
+    def replace_driver(dead):
+        # A crashed browser mid-booking; the booking resumes from its checkpoint in the new one
+        nonlocal driver
+        if pool:
+            driver = pool.replace(dead)
+        else:
             try:
-                driver = init_driver()
-                logger.info(f"Accessing URL: {URL}")
-                driver.get(URL)
-
-                if not wait_for_page_load(driver):
-                    raise Exception("Page did not load fully.")
-
-                if not process_booking(driver, BOOKING_DETAILS, user_details):
-                    raise Exception(f"Failed booking for {user_details['vehicle_reg']}")
-
-                logger.info(f"Booking completed for {user_details['vehicle_reg']}.")
-            
-            except Exception as e:
-                logger.error(f"Error for {user_details['vehicle_reg']}: {e}", exc_info=True)
-            
-            finally:
-                if driver:
-                    driver.quit()
-                logger.info(f"Driver closed for {user_details['vehicle_reg']}.\n")
+                dead.quit()
+            except Exception:
+                pass
+            driver = init_driver(profile, persistent_profile=persistent_profile)
+            open_start_page(driver)
+        return driver
+
+    # Worked out per call rather than taken from config, which fixes them at import
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    booking_data, parking_details = booking_details_for(tomorrow), parking_details_for(tomorrow)
+    # Anything other than just tomorrow is a multi-date batch
+    if dates == [tomorrow]:
+        dates = None
+
+    if http_engine and not gate and not dates:
+        try:
+            result["success"] = http_process_booking(http_engine, user_details, parking_details)
+            result["engine"] = "http"
+            result["finished"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            record_result(result)
+            return result
+        except HttpBookingError as e:
+            logger.warning(f"HTTP booking failed for {vehicle_reg}, falling back to Selenium: {e}")
+
+    try:
+        if pool:
+            # Pooled sessions have already been reset to URL
+            driver = pool.acquire()
+        else:
+            driver = init_driver(profile, persistent_profile=persistent_profile)
+            logger.info(f"Accessing URL: {URL}")
+            open_start_page(driver)
+
+        if not wait_for_page_load(driver):
+            raise Exception("Page did not load fully.")
+
+        if dates:
+            result["dates"] = process_booking_dates(driver, user_details, dates, replace_driver=replace_driver)
+            failed = [day for day, ok in result["dates"].items() if not ok]
+            if failed:
+                raise Exception(f"Failed booking for {vehicle_reg} on {', '.join(failed)}")
+        elif not process_booking(driver, booking_data, user_details, gate=gate, parking_details=parking_details,
+                                 replace_driver=replace_driver):
+            raise Exception(f"Failed booking for {vehicle_reg}")
+
+        result["success"] = True
+        logger.info(f"Booking completed for {vehicle_reg}.")
+
+    except Exception as e:
+        result["error"] = str(e)
+        logger.error(f"Error for {vehicle_reg}: {e}", exc_info=True)
+
+    finally:
+        # A tab shares its browser's performance log with every other tab, so its share can't be told apart
+        if driver and getattr(driver, "profile", None) == "lean" and not isinstance(driver, TabDriverMixin):
+            stats = network_stats(driver)
+            if stats:
+                result["network"] = stats
+                logger.info(
+                    f"Network for {vehicle_reg}: {stats['requests']} requests, {stats['bytes']} bytes; "
+                    f"blocked {stats['blocked_requests']} requests, ~{stats['estimated_bytes_saved']} bytes saved"
+                )
+        if driver and pool:
+            pool.release(driver)
+            logger.info(f"Driver returned to pool for {vehicle_reg}.\n")
+        elif driver:
+            driver.quit()
+            logger.info(f"Driver closed for {vehicle_reg}.\n")
+
+    result["finished"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    record_result(result)
+    return result
+
+def eligible_users(users):
+    """
+    Returns the users with Book=Y, logging the ones that are skipped.
+    """
+    logger = logging.getLogger(__name__)
+    eligible = []
+    for user_details in users:
+        if user_details.get("Book") == "Y":
+            eligible.append(user_details)
         else:
             logger.info(f"Skipping {user_details['vehicle_reg']} because Book=N.")
+    return eligible
+
+def plan_jobs(users, days=None):
+    """
+    Planning pass, run before any browser starts: (user_details, dates) for
+    every Book=Y user with something left to book. Dates come from the
+    toggles (tomorrow, or the next days days); dates the ledger already
+    holds for that vehicle are dropped, so re-runs only redo what failed.
+    """
+    logger = logging.getLogger(__name__)
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    try:
+        ledger = get_ledger()
+    except Exception as e:
+        logger.error(f"Ledger unavailable, planning without it: {e}")
+        ledger = None
+
+    jobs = []
+    for user_details in eligible_users(users):
+        vehicle_reg = user_details['vehicle_reg']
+        if days:
+            dates = booking_dates(user_details, days)
+        else:
+            dates = [tomorrow] if should_book_today(user_details) else []
+        if ledger:
+            booked = [d for d in dates if ledger.is_booked(idempotency_key(vehicle_reg, d.strftime("%Y-%m-%d")))]
+            if booked:
+                logger.info(f"Skipping {vehicle_reg} on {', '.join(str(d) for d in booked)}: already booked.")
+            dates = [d for d in dates if d not in booked]
+        if dates:
+            jobs.append((user_details, dates))
+    logger.info(f"Plan: {len(jobs)} vehicles, {sum(len(d) for _, d in jobs)} bookings to make.")
+    return jobs
+
+def run_parallel(jobs, workers=MAX_WORKERS, pool=None, http_engine=None, gate=None, profile=DRIVER_PROFILE,
+                 persistent_profile=PERSISTENT_PROFILES):
+    """
+    Books every (user_details, dates) job at the same time, one isolated
+    driver per worker thread.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info(f"Running {len(jobs)} bookings with {workers} workers...")
+
+    def _run(user_details, dates):
+        # Name the worker thread after the vehicle so log lines can be told apart
+        threading.current_thread().name = user_details['vehicle_reg']
+        return book_vehicle(user_details, pool, http_engine, gate, profile, dates, persistent_profile)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="booking") as executor:
+        futures = [executor.submit(_run, user_details, dates) for user_details, dates in jobs]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
+
+def main(parallel=False, workers=MAX_WORKERS, use_pool=USE_DRIVER_POOL, engine=BOOKING_ENGINE, release_at=None,
+         profile=DRIVER_PROFILE, days=None, users=None, pool=None, tabs=False, persistent_profile=PERSISTENT_PROFILES):
+    """
+    release_at (a datetime) pre-stages every booking and holds them all at
+    "Book Now" until that instant; it implies parallel mode with one warm
+    driver per vehicle.
+    days books every toggled date in the next days days instead of just tomorrow.
+    users defaults to config.USER_DETAILS_LIST. pool is an already started
+    DriverPool to use (and leave open) instead of building one for this run.
+    tabs runs every booking as an isolated tab in one shared Chrome (TabPool).
+    persistent_profile gives each Chrome a locked profile directory that keeps
+    its disk cache and consent cookies between runs (profiles.py).
+    """
+    logger = configure_logging()
+    # Nothing below launches a browser for a job the plan leaves out
+    jobs = plan_jobs(USER_DETAILS_LIST if users is None else users, days)
+
+    gate = None
+    if release_at:
+        lead = seconds_until(release_at)
+        if lead <= 0:
+            logger.warning(f"Release time {release_at} has already passed; booking immediately.")
+        else:
+            logger.info(f"Pre-staging {len(jobs)} bookings, releasing in {lead:.1f}s at {release_at}.")
+        gate = ReleaseGate(release_at)
+        parallel, workers, use_pool = True, len(jobs), True
+    workers = max(1, min(workers, len(jobs))) if parallel else 1
+
+    http_engine = HttpBookingEngine(URL) if engine == "http" else None
+    own_pool = pool is None
+    if pool and not gate:
+        workers = min(workers, pool.size)
+    elif own_pool and tabs and jobs:
+        pool = TabPool(workers, URL, profile, persistent_profile).start()
+    elif own_pool and use_pool and jobs:
+        pool = DriverPool(
+            workers, URL, factory=functools.partial(init_driver, profile, persistent_profile=persistent_profile)
+        ).start()
+    try:
+        if parallel:
+            results = run_parallel(jobs, workers, pool, http_engine, gate, profile, persistent_profile)
+        else:
+            results = [
+                book_vehicle(user_details, pool, http_engine, profile=profile, dates=dates,
+                             persistent_profile=persistent_profile)
+                for user_details, dates in jobs
+            ]
+    finally:
+        if pool and own_pool:
+            pool.close()
+
+    if gate:
+        summarise_offsets(gate)
+    booked = sum(1 for r in results if r["success"])
+    logger.info(f"Run finished: {booked}/{len(results)} bookings succeeded.")
+    if days:
+        for r in results:
+            logger.info(f"{r['vehicle_reg']}: {r.get('dates', {})}")
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Book parking for every vehicle with Book=Y.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Book all vehicles at the same time instead of one after another.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help="Number of concurrent browsers in parallel mode.")
+    parser.add_argument("--no-pool", action="store_true",
+                        help="Launch a fresh Chrome per vehicle instead of reusing warm sessions.")
+    parser.add_argument("--tabs", action="store_true",
+                        help="Run every booking as an isolated tab in one shared Chrome instead of a Chrome each.")
+    parser.add_argument("--engine", choices=["selenium", "http"], default=BOOKING_ENGINE,
+                        help="'http' tries direct form posts first and falls back to Selenium.")
+    parser.add_argument("--profile", choices=DRIVER_PROFILES, default=DRIVER_PROFILE,
+                        help="'lean' runs headless and blocks resources the booking never needs.")
+    parser.add_argument("--persistent-profile", action=argparse.BooleanOptionalAction, default=PERSISTENT_PROFILES,
+                        help="Give each Chrome its own profile directory that keeps the disk cache and consent "
+                             "cookies between runs.")
+    parser.add_argument("--at", dest="release_at", type=parse_release_time, metavar="HH:MM[:SS]",
+                        help="Pre-stage every booking now and click 'Book Now' together at this time.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Stay resident with warm drivers and take run commands on a Unix socket (see daemon.py).")
+    parser.add_argument("--days", type=int, nargs="?", const=BATCH_DAYS_AHEAD, metavar="N",
+                        help=f"Book every toggled date in the next N days (default {BATCH_DAYS_AHEAD}) "
+                             "in one browser session per vehicle.")
+    args = parser.parse_args()
+    if args.days and args.release_at:
+        parser.error("--days cannot be combined with --at")
+    return args
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.daemon:
+        from daemon import BookingDaemon
+        BookingDaemon(workers=args.workers, profile=args.profile, engine=args.engine,
+                      persistent_profile=args.persistent_profile).serve_forever()
+    else:
+        main(parallel=args.parallel, workers=args.workers, use_pool=not args.no_pool, engine=args.engine,
+             release_at=args.release_at, profile=args.profile, days=args.days, tabs=args.tabs,
+             persistent_profile=args.persistent_profile)
@@ -0,0 +1,109 @@
+# metrics.py
+"""
+Minimal Prometheus text-format metrics for the dashboard: histograms, and an
+incremental reader for the booking trace file written by tracing.py.
+"""
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds; booking steps range from a few ms (validate) to minutes (sold-out waits)
+STEP_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Seconds; dashboard routes
+ROUTE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Histogram:
+    """
+    Cumulative histogram keyed by a fixed set of label names.
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=STEP_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            # [cumulative bucket counts, sum, count]; count doubles as the +Inf bucket
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total, count))
+                            for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in series:
+            pairs = list(zip(self.label_names, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {count}")
+        return "\n".join(lines)
+
+def render_metrics(*metrics):
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+class TraceFileTail:
+    """
+    Reads trace records (one JSON object per line) appended since the last
+    refresh(). Starts again from the top if the file shrinks or is replaced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.identity = None
+        self._partial = b""
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                return []
+            with f:
+                stat = os.fstat(f.fileno())
+                identity = (stat.st_dev, stat.st_ino)
+                if identity != self.identity or stat.st_size < self.offset:
+                    self.offset, self._partial = 0, b""
+                self.identity = identity
+                f.seek(self.offset)
+                chunk = f.read()
+            self.offset += len(chunk)
+            complete, newline, self._partial = (self._partial + chunk).rpartition(b"\n")
+
+            records = []
+            if newline:
+                for line in complete.decode("utf-8", errors="replace").split("\n"):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping malformed trace line in {self.path}")
+            return records
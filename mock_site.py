@@ -0,0 +1,289 @@
+# mock_site.py
+"""
+Local stand-in for the aeroparker booking pages, for offline testing.
+
+Serves the same step sequence as the real site: the date form
+(collectParkingDetails), the product list with Standard Parking (413) and
+TAP Permit (418), the user details form with the terms checkbox and
+PaymentFormSubmit, and a confirmation page with a "Booking Reference:".
+Every response can be delayed (latency, jitter) and Standard Parking can be
+sold out for a while before freeing up (sold_out_for), for benchmarks.
+
+    python mock_site.py --port 8765 --latency 0.2 --sold-out-for 10
+"""
+import argparse
+import html
+import itertools
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+BOOKING_PATH = "/book/Santander/Parking"
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>
+{body}
+</body></html>
+"""
+
+DATE_FORM = """<h1>Parking</h1>
+{alert}
+<form id="parkingForm" method="post" action="{path}?parkingCmd=collectParkingDetails">
+  <input type="hidden" name="_csrf" value="{csrf}">
+  <input type="text" id="changeEntryDate" name="entryDate" value="">
+  <input type="text" id="changeEntryTime" name="entryTime" value="">
+  <input type="text" id="changeExitDate" name="exitDate" value="">
+  <input type="text" id="changeExitTime" name="exitTime" value="19:00">
+  <button class="btn btn-primary" type="submit">Book Now</button>
+</form>
+"""
+
+PREBOOKING_ALERT = """<div class="alert alert-danger"><p role="alert">Pre-booking parking at Unity Place is coming soon</p></div>"""
+
+PRODUCT_ITEM = """<div class="item">
+  <h3>{name}</h3>
+  {cta}
+</div>
+"""
+
+PRODUCT_CTA = """<a class="btn btn-primary btn--submit item__cta" data-step2-item="{pid}" href="{path}?parkingCmd=selectProduct&amp;pid={pid}">Book Now</a>"""
+
+SOLD_OUT = """<div class="item__soldout"><span>Sold Out</span></div>"""
+
+DETAILS_FORM = """<h1>Your Details</h1>
+<form id="PaymentForm" method="post" action="{path}?parkingCmd=confirmBooking">
+  <input type="hidden" name="_csrf" value="{csrf}">
+  <input type="hidden" name="pid" value="{pid}">
+  <input type="text" id="firstName" name="firstName" value="">
+  <input type="text" id="lastName" name="lastName" value="">
+  <input type="email" id="email" name="email" value="">
+  <input type="text" id="registration" name="registration" value="">
+  <input type="checkbox" id="terms" name="terms" value="true">
+  <button id="PaymentFormSubmit" class="btn btn-primary" type="submit">Book and Pay</button>
+</form>
+"""
+
+CONFIRMATION = """<h1>Confirmation</h1>
+<h2>Booking Reference: {reference}</h2>
+<p>Booked for {first_name} {last_name} ({registration}), {entry_date} {entry_time} - {exit_date} {exit_time}</p>
+"""
+
+class MockAeroparker:
+    """
+    State for one mock site: which products are sold out, the per-session
+    progress through the steps, and every booking confirmed so far.
+
+    sold_out keeps Standard Parking sold out; sold_out_for (seconds) sells
+    it out only until that long after the site starts or is reset(). Each
+    response is delayed by latency plus up to jitter seconds.
+    """
+
+    def __init__(self, sold_out=False, prebooking_closed=False, latency=0, jitter=0, sold_out_for=0):
+        self.sold_out = sold_out
+        self.prebooking_closed = prebooking_closed
+        self.latency = latency
+        self.jitter = jitter
+        self.sold_out_for = sold_out_for
+        self.sessions = {}
+        self.bookings = []
+        self._lock = threading.Lock()
+        self._references = itertools.count(100001)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets sessions and restarts the sold_out_for clock (bookings are kept).
+        """
+        with self._lock:
+            self.sessions.clear()
+            self.started = time.monotonic()
+
+    def standard_sold_out(self):
+        return self.sold_out or time.monotonic() - self.started < self.sold_out_for
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def new_session(self):
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self.sessions[session_id] = {"csrf": uuid.uuid4().hex, "step": "dates"}
+        return session_id
+
+    def confirm(self, state, form):
+        with self._lock:
+            reference = f"UP{next(self._references)}"
+            self.bookings.append(dict(state, reference=reference, **form))
+        return reference
+
+class MockHandler(BaseHTTPRequestHandler):
+    site = None  # MockAeroparker, set by make_server
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _session(self):
+        cookies = self.headers.get("Cookie", "")
+        for part in cookies.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "JSESSIONID" and value in self.site.sessions:
+                return value, self.site.sessions[value]
+        session_id = self.site.new_session()
+        return session_id, self.site.sessions[session_id]
+
+    def _send(self, status, title, body, session_id=None):
+        self.site.delay()
+        content = PAGE.format(title=title, body=body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        if session_id:
+            self.send_header("Set-Cookie", f"JSESSIONID={session_id}; Path=/")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _form(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length).decode("utf-8")
+        return {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+
+    def _date_form(self, session_id, state):
+        alert = PREBOOKING_ALERT if self.site.prebooking_closed else ""
+        body = DATE_FORM.format(alert=alert, path=BOOKING_PATH, csrf=state["csrf"])
+        self._send(200, "Parking", body, session_id)
+
+    def _products(self, session_id):
+        standard = SOLD_OUT if self.site.standard_sold_out() else PRODUCT_CTA.format(pid=413, path=BOOKING_PATH)
+        tap = PRODUCT_CTA.format(pid=418, path=BOOKING_PATH)
+        body = (
+            PRODUCT_ITEM.format(name="Standard Parking", cta=standard)
+            + PRODUCT_ITEM.format(name="TAP Permit", cta=tap)
+        )
+        self._send(200, "Choose Product", body, session_id)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if parts.path != BOOKING_PATH:
+            self._send(404, "Not Found", "<h1>Not Found</h1>")
+            return
+
+        session_id, state = self._session()
+        cmd = query.get("parkingCmd")
+        if cmd == "collectParkingDetails":
+            state["step"] = "dates"
+            self._date_form(session_id, state)
+        elif cmd == "selectProduct" and state["step"] == "products":
+            pid = query.get("pid")
+            if pid not in ("413", "418") or (pid == "413" and self.site.standard_sold_out()):
+                self._products(session_id)
+                return
+            state.update(step="details", pid=pid)
+            body = DETAILS_FORM.format(path=BOOKING_PATH, csrf=state["csrf"], pid=pid)
+            self._send(200, "Your Details", body, session_id)
+        elif cmd == "selectProduct" and state["step"] == "details":
+            # Reloading the details page keeps the chosen product
+            body = DETAILS_FORM.format(path=BOOKING_PATH, csrf=state["csrf"], pid=state["pid"])
+            self._send(200, "Your Details", body, session_id)
+        elif state["step"] == "products":
+            self._products(session_id)
+        else:
+            self._date_form(session_id, state)
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        session_id, state = self._session()
+        form = self._form()
+
+        if form.get("_csrf") != state["csrf"]:
+            self._send(403, "Forbidden", "<h1>Session expired</h1>", session_id)
+            return
+
+        cmd = query.get("parkingCmd")
+        if cmd == "collectParkingDetails":
+            if self.site.prebooking_closed or not all(
+                form.get(field) for field in ("entryDate", "entryTime", "exitDate", "exitTime")
+            ):
+                self._date_form(session_id, state)
+                return
+            state.update(
+                step="products",
+                entry_date=form["entryDate"], entry_time=form["entryTime"],
+                exit_date=form["exitDate"], exit_time=form["exitTime"],
+            )
+            self._products(session_id)
+        elif cmd == "confirmBooking" and state["step"] == "details":
+            required = ("firstName", "lastName", "email", "registration")
+            if form.get("terms") != "true" or not all(form.get(field) for field in required):
+                body = DETAILS_FORM.format(path=BOOKING_PATH, csrf=state["csrf"], pid=state["pid"])
+                self._send(200, "Your Details", body, session_id)
+                return
+            reference = self.site.confirm(state, {field: form[field] for field in required})
+            state["step"] = "confirmed"
+            body = CONFIRMATION.format(
+                reference=reference,
+                first_name=html.escape(form["firstName"]),
+                last_name=html.escape(form["lastName"]),
+                registration=html.escape(form["registration"]),
+                entry_date=state["entry_date"], entry_time=state["entry_time"],
+                exit_date=state["exit_date"], exit_time=state["exit_time"],
+            )
+            self._send(200, "Confirmation", body, session_id)
+        else:
+            self._date_form(session_id, state)
+
+def make_server(site=None, host="127.0.0.1", port=0):
+    """
+    Builds a threaded HTTP server for site (a new MockAeroparker by default).
+    port=0 picks a free port; the booking URL is server.booking_url.
+    """
+    site = site or MockAeroparker()
+    handler = type("BoundMockHandler", (MockHandler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.site = site
+    server.booking_url = (
+        f"http://{host}:{server.server_address[1]}{BOOKING_PATH}?parkingCmd=collectParkingDetails"
+    )
+    return server
+
+def start_in_background(site=None, host="127.0.0.1", port=0):
+    """
+    Starts a mock server on a daemon thread and returns it; call shutdown() when done.
+    """
+    server = make_server(site, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the aeroparker booking flow.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sold-out", action="store_true", help="Show Standard Parking as sold out.")
+    parser.add_argument("--sold-out-for", type=float, default=0, metavar="SECONDS",
+                        help="Show Standard Parking as sold out for this long after startup.")
+    parser.add_argument("--prebooking-closed", action="store_true",
+                        help="Show the 'Pre-booking ... coming soon' error on the date form.")
+    parser.add_argument("--latency", type=float, default=0, metavar="SECONDS",
+                        help="Delay every response by this long.")
+    parser.add_argument("--jitter", type=float, default=0, metavar="SECONDS",
+                        help="Add up to this much random delay to every response.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+    site = MockAeroparker(args.sold_out, args.prebooking_closed, args.latency, args.jitter, args.sold_out_for)
+    server = make_server(site, args.host, args.port)
+    print(f"Mock aeroparker site at {server.booking_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
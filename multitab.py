@@ -0,0 +1,180 @@
+# multitab.py
+"""
+Runs many bookings in one Chrome: each vehicle gets a tab in its own browser
+context, so cookies and storage are as separate as in separate browsers,
+for a fraction of the memory of a Chrome process per vehicle.
+
+A WebDriver session only ever drives one window at a time, so every tab is
+wrapped in a TabDriver that switches to its own window before each command
+and holds the browser lock while the command runs. Commands are short
+(navigations return at once with MULTI_TAB_PAGE_LOAD_STRATEGY "none"), so
+the booking threads take turns command by command and one tab's page load
+or sold-out wait overlaps with the others' steps.
+
+    python main.py --parallel --tabs
+    python bench.py --vehicles 4 --mode tabs --save tabs.json
+"""
+import logging
+import threading
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.fedcm import FedCM
+from selenium.webdriver.remote.mobile import Mobile
+from selenium.webdriver.remote.switch_to import SwitchTo
+from selenium.webdriver.support.ui import WebDriverWait
+from config import DRIVER_PROFILE, MULTI_TAB_PAGE_LOAD_STRATEGY, MULTI_TAB_OPEN_TIMEOUT, PERSISTENT_PROFILES
+from driver_utils import init_driver, prepare_target
+
+logger = logging.getLogger(__name__)
+
+class TabDriverMixin:
+    """
+    Makes a copy of the browser's WebDriver act on one tab only.
+    """
+
+    def execute(self, driver_command, params=None):
+        browser = self._tab_browser
+        with browser.lock:
+            if browser.current_handle != self.tab_handle:
+                super().execute(Command.SWITCH_TO_WINDOW, {"handle": self.tab_handle})
+                browser.current_handle = self.tab_handle
+            return super().execute(driver_command, params)
+
+    def quit(self):
+        """
+        Closes the tab and its browser context; the browser keeps running.
+        """
+        self._tab_browser.close_tab(self)
+
+_tab_classes = {}
+
+def _tab_class(driver_class):
+    if driver_class not in _tab_classes:
+        _tab_classes[driver_class] = type(f"Tab{driver_class.__name__}", (TabDriverMixin, driver_class), {})
+    return _tab_classes[driver_class]
+
+class MultiTabBrowser:
+    """
+    One Chrome handing out TabDrivers, each in a fresh browser context.
+    The window Chrome starts with stays open on about:blank for browser-level
+    commands and is never used for a booking.
+    """
+
+    def __init__(self, profile=DRIVER_PROFILE, persistent_profile=PERSISTENT_PROFILES):
+        self.profile = profile
+        self.lock = threading.RLock()
+        self.driver = init_driver(profile, page_load_strategy=MULTI_TAB_PAGE_LOAD_STRATEGY,
+                                  persistent_profile=persistent_profile)
+        self.root_handle = self.driver.current_window_handle
+        self.current_handle = self.root_handle
+        self._contexts = {}
+
+    def _browser_cdp(self, cmd, params):
+        with self.lock:
+            if self.current_handle != self.root_handle:
+                self.driver.switch_to.window(self.root_handle)
+                self.current_handle = self.root_handle
+            return self.driver.execute_cdp_cmd(cmd, params)
+
+    def _wrap(self, handle):
+        tab = object.__new__(_tab_class(type(self.driver)))
+        tab.__dict__.update(self.driver.__dict__)
+        # A persistent profile's quit() wrapper would shut the whole browser
+        tab.__dict__.pop("quit", None)
+        # These hold a reference to the driver they were built for
+        tab._switch_to = SwitchTo(tab)
+        tab._mobile = Mobile(tab)
+        tab._fedcm = FedCM(tab)
+        tab._tab_browser = self
+        tab.tab_handle = handle
+        return tab
+
+    def open_tab(self, url, timeout=MULTI_TAB_OPEN_TIMEOUT):
+        """
+        Opens url in a new tab with its own cookies and storage, and returns
+        a driver for that tab once the page has loaded.
+        """
+        context_id = self._browser_cdp("Target.createBrowserContext", {})["browserContextId"]
+        try:
+            target_id = self._browser_cdp("Target.createTarget", {
+                "url": "about:blank", "browserContextId": context_id, "newWindow": True,
+            })["targetId"]
+        except Exception:
+            self._browser_cdp("Target.disposeBrowserContext", {"browserContextId": context_id})
+            raise
+        # ChromeDriver uses the target id as the window handle
+        tab = self._wrap(target_id)
+        self._contexts[target_id] = context_id
+        try:
+            # Stealth and lean blocking are per target; set them up before the first real page
+            prepare_target(tab)
+            tab.get(url)
+            WebDriverWait(tab, timeout).until(lambda d: d.execute_script(
+                "return location.href !== 'about:blank' && document.readyState === 'complete'"
+            ))
+        except Exception:
+            self.close_tab(tab)
+            raise
+        return tab
+
+    def close_tab(self, tab):
+        context_id = self._contexts.pop(tab.tab_handle, None)
+        with self.lock:
+            try:
+                if self.current_handle != tab.tab_handle:
+                    self.driver.switch_to.window(tab.tab_handle)
+                self.driver.close()
+            except WebDriverException as e:
+                logger.warning(f"Could not close tab {tab.tab_handle}: {str(e)}")
+            finally:
+                self.current_handle = None
+            if context_id:
+                try:
+                    self._browser_cdp("Target.disposeBrowserContext", {"browserContextId": context_id})
+                except WebDriverException as e:
+                    logger.warning(f"Could not dispose browser context {context_id}: {str(e)}")
+
+    def quit(self):
+        self.driver.quit()
+
+class TabPool:
+    """
+    DriverPool stand-in for main.py --tabs: every acquire() opens a fresh
+    isolated tab on url in one shared Chrome, and release() closes it.
+    """
+
+    def __init__(self, size, url, profile=DRIVER_PROFILE, persistent_profile=PERSISTENT_PROFILES):
+        self.size = size
+        self.url = url
+        self.profile = profile
+        self.persistent_profile = persistent_profile
+        self.browser = None
+
+    def start(self):
+        logger.info(f"Starting one Chrome for up to {self.size} booking tabs...")
+        self.browser = MultiTabBrowser(self.profile, self.persistent_profile)
+        return self
+
+    def grow(self, size):
+        # Tabs are opened on demand; size only caps the worker count
+        self.size = max(self.size, size)
+
+    def refresh(self):
+        pass
+
+    def acquire(self, timeout=None):
+        return self.browser.open_tab(self.url)
+
+    def release(self, driver):
+        driver.quit()
+
+    def replace(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        return self.acquire()
+
+    def close(self):
+        if self.browser:
+            self.browser.quit()
@@ -0,0 +1,145 @@
+# profiles.py
+"""
+Managed Chrome profiles (--user-data-dir), one per worker.
+
+A fresh temporary profile means every run downloads the site's static
+assets again and clicks through its consent banner again. With
+PERSISTENT_PROFILES each Chrome instead gets a slot directory under
+PROFILE_ROOT (worker-1, worker-2, ...). Each slot has its own lock file,
+held for as long as the browser runs, so two workers, or main.py and the
+daemon, never open the same profile. A slot that has not been checked for
+PROFILE_CLEANUP_INTERVAL has its caches trimmed to PROFILE_CACHE_MAX_MB,
+oldest files first, before Chrome starts on it.
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+from config import PROFILE_ROOT, PROFILE_CACHE_MAX_MB, PROFILE_CLEANUP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Cache directories inside a profile that the cleanup trims
+CACHE_DIRS = (
+    os.path.join("Default", "Cache"),
+    os.path.join("Default", "Code Cache"),
+    "GrShaderCache",
+    "ShaderCache",
+)
+# Touched after every cleanup check
+CLEANUP_STAMP = ".last_cleanup"
+
+def _cache_files(profile_dir):
+    files = []
+    for cache_dir in CACHE_DIRS:
+        for root, _, names in os.walk(os.path.join(profile_dir, cache_dir)):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+def trim_cache(profile_dir, max_bytes):
+    """
+    Deletes the least recently written cache files until the profile's caches
+    fit in max_bytes. Chrome must not be running on the profile.
+    Returns the number of bytes freed.
+    """
+    files = sorted(_cache_files(profile_dir))
+    total = sum(size for _, size, _ in files)
+    freed = 0
+    for _, size, path in files:
+        if total - freed <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            freed += size
+        except OSError:
+            pass
+    return freed
+
+class ManagedProfile:
+    """
+    A locked profile slot. warm is False the first time the slot is used.
+    """
+
+    def __init__(self, path, lock_file, warm):
+        self.path = path
+        self.warm = warm
+        self._lock_file = lock_file
+
+    def release(self):
+        if self._lock_file:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+            logger.info(f"Released Chrome profile {self.path}")
+
+class ProfileManager:
+    """
+    Hands out profile slots under root, creating a new slot when every
+    existing one is locked.
+    """
+
+    def __init__(self, root=PROFILE_ROOT, cache_max_mb=PROFILE_CACHE_MAX_MB,
+                 cleanup_interval=PROFILE_CLEANUP_INTERVAL):
+        self.root = root
+        self.cache_max_bytes = cache_max_mb * 1024 * 1024
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock:
+            slot = 1
+            while True:
+                path = os.path.join(self.root, f"worker-{slot}")
+                lock_file = open(f"{path}.lock", "a")
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    lock_file.close()
+                    slot += 1
+        warm = os.path.isdir(path)
+        os.makedirs(path, exist_ok=True)
+        profile = ManagedProfile(path, lock_file, warm)
+        logger.info(f"Using {'warm' if warm else 'new'} Chrome profile {path}")
+        try:
+            self.cleanup(path)
+        except OSError as e:
+            logger.warning(f"Could not clean up Chrome profile {path}: {str(e)}")
+        return profile
+
+    def cleanup(self, path):
+        """
+        Trims the profile's caches if it has not been checked for cleanup_interval.
+        """
+        stamp = os.path.join(path, CLEANUP_STAMP)
+        try:
+            if time.time() - os.path.getmtime(stamp) < self.cleanup_interval:
+                return
+        except OSError:
+            pass
+        freed = trim_cache(path, self.cache_max_bytes)
+        if freed:
+            logger.info(f"Trimmed {freed / 1024 / 1024:.1f}MB of cache from {path}")
+        with open(stamp, "w"):
+            pass
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_profile_manager():
+    """
+    The profile manager for PROFILE_ROOT, created on first use.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ProfileManager()
+        return _manager
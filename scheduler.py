@@ -0,0 +1,110 @@
+# scheduler.py
+"""
+Release-time scheduling: every booking is pre-staged up to the "Book Now"
+click and then held at a ReleaseGate until the target instant.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Below this much time before the target, waiters spin instead of sleeping
+SPIN_WINDOW = 0.02
+# Longest single sleep while waiting, so the target is re-checked at least this
+# often; it is on the monotonic clock, which wall-clock adjustments never move
+MAX_SLEEP = 1.0
+
+def parse_release_time(value, now=None):
+    """
+    Parses "HH:MM", "HH:MM:SS[.ffffff]" or a full ISO datetime. A time of day
+    that has already passed today means that time tomorrow; a full datetime
+    in the past is refused, since the gate would open at once.
+    """
+    now = now or datetime.now()
+    try:
+        release = datetime.fromisoformat(value)
+    except ValueError:
+        release = None
+    if release:
+        if release <= (now.astimezone(release.tzinfo) if release.tzinfo else now):
+            raise ValueError(f"Release time {value} has already passed.")
+        return release
+    for fmt in ("%H:%M:%S.%f", "%H:%M:%S", "%H:%M"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        release = now.replace(hour=parsed.hour, minute=parsed.minute,
+                              second=parsed.second, microsecond=parsed.microsecond)
+        if release <= now:
+            release += timedelta(days=1)
+        return release
+    raise ValueError(f"Unrecognised release time '{value}', expected HH:MM[:SS] or an ISO datetime.")
+
+class ReleaseGate:
+    """
+    Holds any number of threads until a wall-clock target, then lets them all go.
+
+    The target is converted to the monotonic clock once, so NTP adjustments
+    while waiting do not move it. Waiters sleep until SPIN_WINDOW before the
+    target and spin for the final milliseconds.
+    """
+
+    def __init__(self, target, spin_window=SPIN_WINDOW):
+        self.target = target
+        self.spin_window = spin_window
+        self.target_monotonic = time.monotonic() + (target.timestamp() - time.time())
+        self.offsets = {}
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        return self.target_monotonic - time.monotonic()
+
+    def wait(self):
+        """
+        Blocks until the target instant. Returns at once if it has passed.
+        """
+        remaining = self.remaining()
+        if remaining > 0:
+            logger.info(f"Holding at 'Book Now' for {remaining:.3f}s until {self.target.strftime('%H:%M:%S.%f')[:-3]}")
+        while True:
+            remaining = self.remaining()
+            if remaining <= 0:
+                return
+            if remaining > self.spin_window:
+                time.sleep(min(remaining - self.spin_window, MAX_SLEEP))
+            else:
+                # Spin; sleep(0) yields the GIL so other waiters spin too
+                time.sleep(0)
+
+    def record_click(self, label=None):
+        """
+        Records and logs how long after the target the first click happened (ms).
+        Only the first call per label counts.
+        """
+        offset_ms = -self.remaining() * 1000
+        label = label or threading.current_thread().name
+        with self._lock:
+            if label in self.offsets:
+                return self.offsets[label]
+            self.offsets[label] = offset_ms
+        logger.info(f"Release offset for {label}: first click {offset_ms:+.1f} ms after target")
+        return offset_ms
+
+def summarise_offsets(gate):
+    """
+    Logs the spread of release offsets across all vehicles.
+    """
+    if not gate.offsets:
+        logger.warning("No vehicle reached the release gate.")
+        return
+    offsets = sorted(gate.offsets.values())
+    logger.info(
+        f"Release offsets for {len(offsets)} vehicles: "
+        f"min {offsets[0]:+.1f} ms, max {offsets[-1]:+.1f} ms, spread {offsets[-1] - offsets[0]:.1f} ms"
+    )
+
+def seconds_until(target):
+    return (target - datetime.now()) / timedelta(seconds=1)
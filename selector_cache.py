@@ -0,0 +1,140 @@
+# selector_cache.py
+"""
+Resolve a list of fallback selectors in one round trip, remembering which
+one worked for each step so the next run tries it first.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from selenium.webdriver.common.by import By
+from config import SELECTOR_CACHE_FILE
+
+logger = logging.getLogger(__name__)
+
+# How often resolve() re-runs the lookup script while nothing matches
+POLL_INTERVAL = 0.1
+
+# Returns [index, element] for the first candidate that matches (and is
+# clickable, if asked), or null. CSS and XPath candidates are both supported.
+RESOLVE_SCRIPT = """
+const candidates = arguments[0], clickable = arguments[1];
+for (let i = 0; i < candidates.length; i++) {
+    const kind = candidates[i][0], value = candidates[i][1];
+    let el = null;
+    try {
+        el = kind === 'xpath'
+            ? document.evaluate(value, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+            : document.querySelector(value);
+    } catch (e) {
+        continue;
+    }
+    if (!el) continue;
+    if (clickable) {
+        const rect = el.getBoundingClientRect();
+        const style = window.getComputedStyle(el);
+        if (el.disabled || rect.width === 0 || rect.height === 0 ||
+            style.visibility === 'hidden' || style.display === 'none') continue;
+    }
+    return [i, el];
+}
+return null;
+"""
+
+def selector_key(selector):
+    by, value = selector
+    return f"{by}={value}"
+
+class SelectorCache:
+    """
+    step -> winning selector, persisted as JSON, with per-step hit/miss counts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                self.winners = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.winners = {}
+
+    def winner(self, step):
+        with self._lock:
+            return self.winners.get(step)
+
+    def order(self, step, selectors):
+        """
+        selectors with the step's last winner moved to the front.
+        """
+        winner = self.winner(step)
+        for i, selector in enumerate(selectors):
+            if selector_key(selector) == winner:
+                return [selector] + selectors[:i] + selectors[i + 1:]
+        return list(selectors)
+
+    def record(self, step, selector, hit):
+        with self._lock:
+            hits, misses = self.stats.get(step, (0, 0))
+            self.stats[step] = (hits + 1, misses) if hit else (hits, misses + 1)
+            hits, misses = self.stats[step]
+            key = selector_key(selector)
+            changed = self.winners.get(step) != key
+            self.winners[step] = key
+            if changed:
+                self._save()
+        logger.info(
+            f"Selector cache {'hit' if hit else 'miss'} for '{step}' "
+            f"({hits}/{hits + misses} hits, {100 * hits / (hits + misses):.0f}%)"
+        )
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".selectors-", suffix=".json", dir=directory)
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.winners, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save selector cache: {str(e)}")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_selector_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SelectorCache(SELECTOR_CACHE_FILE)
+        return _cache
+
+def resolve(driver, step, selectors, timeout=5, clickable=False, cache=None):
+    """
+    Checks every candidate selector in a single execute_script call (repeated
+    every POLL_INTERVAL until timeout) and returns (element, selector) for the
+    first match in priority order, or (None, None).
+    """
+    cache = cache or get_selector_cache()
+    previous = cache.winner(step)
+    ordered = cache.order(step, selectors)
+    candidates = [["xpath" if by == By.XPATH else "css", value] for by, value in ordered]
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            found = driver.execute_script(RESOLVE_SCRIPT, candidates, clickable)
+        except Exception as e:
+            logger.warning(f"Selector lookup for '{step}' failed: {str(e)}")
+            found = None
+        if found:
+            index, element = found
+            selector = ordered[index]
+            cache.record(step, selector, hit=selector_key(selector) == previous)
+            return element, selector
+        if time.monotonic() >= deadline:
+            logger.warning(f"No selector matched for '{step}' within {timeout}s.")
+            return None, None
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,104 @@
+# tests/test_booking_file.py
+import json
+import os
+
+from booking_file import BookingFileTail
+
+def record(reference, name="Pankaj", when="2026-10-18 12:07:29"):
+    return f"Booking Date: {when}\n BOOKED FOR {name}\nBooking Reference: {reference}\n"
+
+def references(records):
+    return [r["reference"] for r in records]
+
+def write(path, text, mode="a"):
+    with open(path, mode) as f:
+        f.write(text)
+
+def test_refresh_returns_only_new_records(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1") + record("A2"))
+    tail = BookingFileTail(str(path))
+    assert references(tail.refresh()) == ["A1", "A2"]
+    assert tail.refresh() == []
+    write(path, record("A3"))
+    assert references(tail.refresh()) == ["A3"]
+
+def test_parsed_record_fields(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1", name="Sam", when="2026-10-18 09:00:00"))
+    assert BookingFileTail(str(path)).refresh() == [
+        {"date": "2026-10-18 09:00:00", "name": "Sam", "reference": "A1"}
+    ]
+
+def test_record_split_across_writes(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    text = record("A1")
+    write(path, text[:30])
+    tail = BookingFileTail(str(path))
+    assert tail.refresh() == []
+    write(path, text[30:])
+    assert references(tail.refresh()) == ["A1"]
+
+def test_restart_resumes_from_saved_state(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1") + record("A2"))
+    tail = BookingFileTail(str(path))
+    tail.refresh()
+    state = json.loads(json.dumps(tail.state()))
+    write(path, record("A3"))
+    assert references(BookingFileTail(str(path), state).refresh()) == ["A3"]
+
+def test_restart_rereads_a_record_cut_off_mid_write(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    partial = record("A2")[:35]
+    write(path, record("A1") + partial)
+    tail = BookingFileTail(str(path))
+    assert references(tail.refresh()) == ["A1"]
+    state = tail.state()
+    write(path, record("A2")[35:])
+    assert references(BookingFileTail(str(path), state).refresh()) == ["A2"]
+
+def test_no_state_before_first_read(tmp_path):
+    assert BookingFileTail(str(tmp_path / "missing.txt")).state() is None
+
+def test_truncation_rereads_from_start(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1") + record("A2"))
+    tail = BookingFileTail(str(path))
+    tail.refresh()
+    write(path, record("B1"), mode="w")
+    assert references(tail.refresh()) == ["B1"]
+
+def test_rotation_rereads_the_new_file(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1"))
+    tail = BookingFileTail(str(path))
+    tail.refresh()
+    os.rename(path, tmp_path / "booking_reference.txt.1")
+    write(path, record("B1") + record("B2"))
+    assert references(tail.refresh()) == ["B1", "B2"]
+
+def test_rewrite_in_place_to_a_longer_file_is_detected(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1"))
+    tail = BookingFileTail(str(path))
+    tail.refresh()
+    write(path, record("B1", name="Someone else") + record("B2"), mode="w")
+    assert references(tail.refresh()) == ["B1", "B2"]
+
+def test_saved_state_of_a_rotated_file_is_ignored(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    write(path, record("A1"))
+    tail = BookingFileTail(str(path))
+    tail.refresh()
+    state = tail.state()
+    os.rename(path, tmp_path / "booking_reference.txt.1")
+    write(path, record("B1") + record("B2"))
+    assert references(BookingFileTail(str(path), state).refresh()) == ["B1", "B2"]
+
+def test_missing_file_then_created(tmp_path):
+    path = tmp_path / "booking_reference.txt"
+    tail = BookingFileTail(str(path))
+    assert tail.refresh() == []
+    write(path, record("A1"))
+    assert references(tail.refresh()) == ["A1"]
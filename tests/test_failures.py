@@ -0,0 +1,75 @@
+# tests/test_failures.py
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+import failures
+from failures import (
+    CAPACITY, PERMANENT, TRANSIENT, CapacityFailure, PermanentFailure, RetryBudget, RetryPolicy, classify,
+)
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(failures.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    monkeypatch.setattr(failures, "JITTER", 0)
+
+def budget(**policies):
+    return RetryBudget({kind: RetryPolicy(**policy) for kind, policy in policies.items()})
+
+def test_backoff_doubles_up_to_max_delay(clock):
+    retries = budget(transient={"retries": 5, "base_delay": 2, "max_delay": 10, "budget": 1000})
+    assert [retries.next_delay(TRANSIENT) for _ in range(5)] == [2, 4, 8, 10, 10]
+
+def test_out_of_retries(clock):
+    retries = budget(transient={"retries": 2, "base_delay": 1, "max_delay": 1, "budget": 1000})
+    assert retries.next_delay(TRANSIENT) == 1
+    assert retries.next_delay(TRANSIENT) == 1
+    assert retries.next_delay(TRANSIENT) is None
+
+def test_time_budget_counts_from_first_failure(clock):
+    retries = budget(capacity={"retries": 10, "base_delay": 30, "max_delay": 30, "budget": 100})
+    assert retries.next_delay(CAPACITY) == 30
+    clock[0] += 60
+    # 60s used + 30s backoff still fits in 100s
+    assert retries.next_delay(CAPACITY) == 30
+    clock[0] += 20
+    assert retries.next_delay(CAPACITY) is None
+
+def test_classes_are_counted_separately(clock):
+    retries = budget(
+        transient={"retries": 1, "base_delay": 1, "max_delay": 1, "budget": 100},
+        capacity={"retries": 1, "base_delay": 5, "max_delay": 5, "budget": 100},
+    )
+    assert retries.next_delay(TRANSIENT) == 1
+    assert retries.next_delay(CAPACITY) == 5
+    assert retries.next_delay(TRANSIENT) is None
+    assert retries.failures == {TRANSIENT: 2, CAPACITY: 1}
+
+def test_permanent_failures_are_not_retried(clock):
+    retries = budget(permanent={"retries": 0, "base_delay": 0, "max_delay": 0, "budget": 0})
+    assert retries.next_delay(PERMANENT) is None
+
+def test_remaining_budget(clock):
+    retries = budget(capacity={"retries": 3, "base_delay": 1, "max_delay": 1, "budget": 100})
+    assert retries.remaining(CAPACITY) is None
+    retries.next_delay(CAPACITY)
+    clock[0] += 40
+    assert retries.remaining(CAPACITY) == 60
+    clock[0] += 100
+    assert retries.remaining(CAPACITY) == 0
+
+def test_jitter_stays_within_bounds(monkeypatch):
+    monkeypatch.setattr(failures, "JITTER", 0.2)
+    policy = RetryPolicy(retries=1, base_delay=10, max_delay=10, budget=100)
+    assert all(8 <= policy.delay(1) <= 12 for _ in range(100))
+
+def test_classify():
+    assert classify(CapacityFailure("sold out")) == CAPACITY
+    assert classify(PermanentFailure("closed")) == PERMANENT
+    assert classify(ValueError("date passed")) == PERMANENT
+    assert classify(TimeoutException("slow")) == TRANSIENT
+    assert classify(RuntimeError("anything else")) == TRANSIENT
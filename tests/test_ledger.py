@@ -0,0 +1,75 @@
+# tests/test_ledger.py
+import pytest
+
+from ledger import BOOKED, BUSY, CLAIMED, BookingLedger, idempotency_key
+
+@pytest.fixture
+def ledger(tmp_path):
+    return BookingLedger(str(tmp_path / "bookings.db"))
+
+def add_bookings(ledger, count, day="2026-10-18"):
+    for i in range(count):
+        ledger.record(f"REF{i:03d}", f"User {i}", booked_at=f"{day} 12:00:{i:02d}")
+
+def test_pages_cover_every_booking_once_in_order(ledger):
+    add_bookings(ledger, 7)
+    references, cursor = [], None
+    while True:
+        bookings, cursor = ledger.page(3, cursor)
+        references.extend(b["reference"] for b in bookings)
+        if cursor is None:
+            break
+    assert references == [f"REF{i:03d}" for i in range(7)]
+
+def test_last_full_page_has_no_cursor(ledger):
+    add_bookings(ledger, 6)
+    _, cursor = ledger.page(3)
+    bookings, cursor = ledger.page(3, cursor)
+    assert len(bookings) == 3
+    assert cursor is None
+
+def test_pages_break_booked_at_ties_by_id(ledger):
+    for i in range(4):
+        ledger.record(f"TIE{i}", "Same", booked_at="2026-10-18 12:00:00")
+    first, cursor = ledger.page(2)
+    second, _ = ledger.page(2, cursor)
+    assert [b["reference"] for b in first + second] == ["TIE0", "TIE1", "TIE2", "TIE3"]
+
+def test_pages_apply_filters(ledger):
+    add_bookings(ledger, 3, day="2026-10-17")
+    ledger.record("LATER", "Late", booked_at="2026-10-19 08:00:00")
+    bookings, cursor = ledger.page(10, start_date="2026-10-19")
+    assert [b["reference"] for b in bookings] == ["LATER"]
+    assert cursor is None
+
+def test_malformed_cursor_is_refused(ledger):
+    with pytest.raises(ValueError):
+        ledger.page(3, "not-a-cursor")
+
+def test_claim_blocks_other_owners_until_ttl(ledger):
+    key = idempotency_key("ab12 cde", "2026-10-19")
+    assert ledger.claim(key, "run-1", ttl=60) == CLAIMED
+    assert ledger.claim(key, "run-2", ttl=60) == BUSY
+    # The same owner may claim again
+    assert ledger.claim(key, "run-1", ttl=60) == CLAIMED
+
+def test_stale_claim_is_taken_over(ledger):
+    key = idempotency_key("AB12CDE", "2026-10-19")
+    assert ledger.claim(key, "run-1", ttl=60) == CLAIMED
+    assert ledger.claim(key, "run-2", ttl=0) == CLAIMED
+    # run-1 lost the claim to run-2
+    assert not ledger.renew_claim(key, "run-1")
+    assert ledger.renew_claim(key, "run-2")
+
+def test_released_claim_is_free(ledger):
+    key = idempotency_key("AB12CDE", "2026-10-19")
+    ledger.claim(key, "run-1", ttl=60)
+    ledger.release_claim(key, "run-1")
+    assert ledger.claim(key, "run-2", ttl=60) == CLAIMED
+
+def test_recorded_booking_is_never_claimed_again(ledger):
+    key = idempotency_key("AB12CDE", "2026-10-19")
+    ledger.claim(key, "run-1", ttl=60)
+    assert ledger.record("REF1", "User", parking_date="2026-10-19", idempotency_key=key)
+    assert ledger.claim(key, "run-2", ttl=0) == BOOKED
+    assert ledger.is_booked(key)
@@ -0,0 +1,31 @@
+# tests/test_scheduler.py
+from datetime import datetime
+
+import pytest
+
+from scheduler import parse_release_time
+
+NOW = datetime(2026, 10, 18, 22, 0, 0)
+
+def test_time_later_today_stays_today():
+    assert parse_release_time("23:30", now=NOW) == datetime(2026, 10, 18, 23, 30)
+
+def test_time_already_passed_rolls_to_tomorrow():
+    assert parse_release_time("06:00", now=NOW) == datetime(2026, 10, 19, 6, 0)
+
+def test_time_equal_to_now_rolls_to_tomorrow():
+    assert parse_release_time("22:00:00", now=NOW) == datetime(2026, 10, 19, 22, 0)
+
+def test_seconds_and_fraction_are_kept():
+    assert parse_release_time("06:00:01.250000", now=NOW) == datetime(2026, 10, 19, 6, 0, 1, 250000)
+
+def test_full_datetime_in_future_is_used_as_is():
+    assert parse_release_time("2026-10-19T06:00:00", now=NOW) == datetime(2026, 10, 19, 6, 0)
+
+def test_full_datetime_in_past_is_refused():
+    with pytest.raises(ValueError, match="already passed"):
+        parse_release_time("2026-10-18T06:00:00", now=NOW)
+
+def test_unrecognised_time_is_refused():
+    with pytest.raises(ValueError, match="Unrecognised"):
+        parse_release_time("6am", now=NOW)
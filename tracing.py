@@ -0,0 +1,104 @@
+# tracing.py
+"""
+Per-step timing spans for one booking.
+
+process_booking() starts a BookingTrace for the vehicle; the steps it calls
+wrap themselves in span("step"), which times against whichever trace is
+active on the current thread (and does nothing if there is none). When the
+booking ends the trace is appended as one JSON line to TRACE_FILE, where
+app.py picks it up for /metrics.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from config import TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_trace_file_lock = threading.Lock()
+
+class BookingTrace:
+    """
+    Spans ({"step", "start_ms", "duration_ms"[, "error"]}) for one vehicle,
+    timed on the monotonic clock relative to the start of the booking.
+    """
+
+    def __init__(self, vehicle_reg, engine="selenium", booking_date=None, path=None):
+        self.vehicle_reg = vehicle_reg
+        self.engine = engine
+        self.booking_date = booking_date
+        self.path = path or TRACE_FILE
+        self.started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.spans = []
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, step):
+        start = time.perf_counter()
+        entry = {"step": step, "start_ms": round((start - self._t0) * 1000, 1)}
+        try:
+            yield entry
+        except BaseException as e:
+            entry["error"] = type(e).__name__
+            raise
+        finally:
+            entry["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self.spans.append(entry)
+
+    def finish(self, success):
+        """
+        Writes the trace as one JSON line and returns it.
+        """
+        record = {
+            "vehicle_reg": self.vehicle_reg,
+            "engine": self.engine,
+            "booking_date": self.booking_date,
+            "started": self.started,
+            "success": bool(success),
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 1),
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+        try:
+            line = json.dumps(record) + "\n"
+            with _trace_file_lock:
+                with open(self.path, "a") as f:
+                    f.write(line)
+        except OSError as e:
+            logger.warning(f"Could not write booking trace: {str(e)}")
+        logger.info(
+            f"Timings for {self.vehicle_reg}: "
+            + ", ".join(f"{s['step']}={s['duration_ms']:.0f}ms" for s in record["spans"])
+        )
+        return record
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+@contextmanager
+def tracing(vehicle_reg, engine="selenium", booking_date=None):
+    """
+    Makes a new BookingTrace the current thread's active trace for the block.
+    The caller finishes it.
+    """
+    previous = current_trace()
+    trace = _local.trace = BookingTrace(vehicle_reg, engine, booking_date)
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+@contextmanager
+def span(step):
+    """
+    Times step against the current thread's trace, if any.
+    """
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    with trace.span(step) as entry:
+        yield entry
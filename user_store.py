@@ -0,0 +1,104 @@
+# user_store.py
+"""
+User store: a JSON file keyed by email, replacing the USER_DETAILS_LIST
+literal that app.py used to rewrite inside config.py.
+
+Writes take an exclusive lock on a sidecar .lock file, re-read the latest
+data, and replace the file atomically (write temp file, fsync, rename), so
+concurrent /update calls can neither corrupt the file nor lose each other's
+changes. Readers never need the lock.
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class UserStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        # flock is per open file, so threads in this process also exclude each other
+        self._thread_lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return data.get("users", {})
+
+    def _write(self, users):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".users-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"users": users}, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        """
+        All users, in insertion order.
+        """
+        return list(self._read().values())
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields the {email: user} dict under the write lock; it is written back
+        atomically, once, when the block exits without an exception.
+        """
+        with self._locked():
+            users = self._read()
+            yield users
+            self._write(users)
+
+    def migrate(self, seed_users):
+        """
+        Creates the store from seed_users if it does not exist yet.
+        Returns True if the store was created.
+        """
+        with self._locked():
+            if self.exists():
+                return False
+            self._write({user["email"]: user for user in seed_users})
+        logger.info(f"Migrated {len(seed_users)} users into {self.path}.")
+        return True
+
+def load_users(path, seed=None):
+    """
+    Users from the store at path, migrating seed into it on first use.
+    Falls back to seed if the store cannot be created.
+    """
+    store = UserStore(path)
+    try:
+        if seed is not None and not store.exists():
+            store.migrate(seed)
+        return store.load()
+    except OSError as e:
+        logger.error(f"Could not use user store {path}, using config.py users: {str(e)}")
+        return list(seed or [])
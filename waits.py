@@ -0,0 +1,152 @@
+# waits.py
+import logging
+import time
+from contextlib import contextmanager
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from config import WAIT_PROFILE, BOOKING_LATENCY_BUDGET
+
+logger = logging.getLogger(__name__)
+
+# Per-step waits: step -> (fixed sleep used by "conservative", condition timeout used by "fast")
+WAIT_STEPS = {
+    "page_settle": (2, 0),
+    "form_ready": (5, 10),
+    "date_set": (2, 3),
+    "book_now": (2, 10),
+    "product_selected": (2, 10),
+    "field_set": (1, 3),
+    "typing_focus": (2, 2),
+    "typing_clear": (1, 2),
+    "typing_set": (2, 3),
+    "terms_visible": (1, 3),
+    "retry_back": (5, 10),
+}
+
+WAIT_PROFILES = ("fast", "conservative")
+
+# How often "fast" waits re-check their condition
+POLL_INTERVAL = 0.1
+
+class LatencyBudgetExceeded(TimeoutException):
+    """
+    Raised when a booking has used up its overall latency budget.
+    """
+
+def page_settle_delay(profile=WAIT_PROFILE):
+    """
+    Extra fixed wait after document.readyState == 'complete' (0 unless conservative).
+    """
+    return WAIT_STEPS["page_settle"][0] if profile == "conservative" else 0
+
+def value_is(locator, expected):
+    """
+    Condition: the element's value equals expected (i.e. the input has "stuck").
+    """
+    def _check(driver):
+        try:
+            return driver.find_element(*locator).get_attribute("value") == expected
+        except Exception:
+            return False
+    return _check
+
+def any_present(*locators):
+    """
+    Condition: at least one of the locators matches an element.
+    """
+    def _check(driver):
+        for locator in locators:
+            if driver.find_elements(*locator):
+                return True
+        return False
+    return _check
+
+def element_clickable(locator):
+    """
+    Condition: the element is displayed and enabled.
+    """
+    def _check(driver):
+        try:
+            element = driver.find_element(*locator)
+            return element.is_displayed() and element.is_enabled()
+        except Exception:
+            return False
+    return _check
+
+def all_of(*conditions):
+    def _check(driver):
+        return all(condition(driver) for condition in conditions)
+    return _check
+
+class BookingWaits:
+    """
+    Wait strategy for one booking.
+
+    "fast" waits on a concrete DOM condition for each step, bounded by the
+    step's timeout and by what is left of the booking's latency budget.
+    "conservative" keeps the original fixed sleeps and ignores the conditions.
+    """
+
+    def __init__(self, profile=WAIT_PROFILE, budget=BOOKING_LATENCY_BUDGET):
+        if profile not in WAIT_PROFILES:
+            raise ValueError(f"Unknown wait profile '{profile}', expected one of {WAIT_PROFILES}")
+        self.profile = profile
+        self.budget = budget
+        self.started = time.monotonic()
+        self.deadline = self.started + budget
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def check_budget(self):
+        if self.remaining() <= 0:
+            raise LatencyBudgetExceeded(f"Booking exceeded its {self.budget}s latency budget.")
+
+    def timeout(self, step):
+        """
+        The step's own timeout, capped by the remaining latency budget.
+        """
+        self.check_budget()
+        return min(WAIT_STEPS[step][1], self.remaining())
+
+    def settle(self, driver, step, condition=None):
+        """
+        Waits until the page is ready for the next action after step.
+        Returns False if the condition did not hold within the step timeout.
+        """
+        if self.profile == "conservative":
+            time.sleep(WAIT_STEPS[step][0])
+            return True
+
+        if condition is None:
+            self.check_budget()
+            return True
+
+        try:
+            WebDriverWait(driver, self.timeout(step), poll_frequency=POLL_INTERVAL).until(condition)
+            return True
+        except LatencyBudgetExceeded:
+            raise
+        except TimeoutException:
+            self.check_budget()
+            logger.warning(f"Wait step '{step}' timed out after {WAIT_STEPS[step][1]}s.")
+            return False
+
+    def restart(self):
+        """
+        Gives a retried attempt a fresh latency budget.
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + self.budget
+
+    @contextmanager
+    def unbudgeted(self):
+        """
+        Time spent inside this block (e.g. waiting for sold-out parking to free up)
+        does not count against the latency budget.
+        """
+        entered = time.monotonic()
+        try:
+            yield
+        finally:
+            self.deadline += time.monotonic() - entered